@@ -1,8 +1,53 @@
 # region imports
 import numpy as np
 import math
+import copy
+from collections import OrderedDict, deque
 from scipy.optimize import fsolve
-import random as rnd
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+from scipy.sparse.linalg import spsolve
+# endregion
+
+# per-scenario convergence record returned by PipeNetwork.solveScenarios
+SCENARIO_DTYPE = np.dtype([('converged', bool), ('iterations', np.int32), ('residual', float)])
+
+# region friction factor functions
+def frictionFactors(Re, relrough, tol=1e-12, maxIter=50, derivative=False):
+    # Darcy friction factor for whole arrays of pipes at once.  Laminar (Re <= 2000) uses 64/Re, turbulent
+    # (Re >= 4000) solves Colebrook by Newton iteration on 1/sqrt(f) seeded from Swamee-Jain, and the
+    # transitional range blends linearly between the two.  Only |Re| matters, so reversed flows behave.
+    # With derivative=True, df/d|Re| is returned as well.
+    Re, relrough = np.broadcast_arrays(np.abs(np.asarray(Re, dtype=float)), np.asarray(relrough, dtype=float))
+    shape = Re.shape
+    Re, relrough = Re.ravel(), relrough.ravel()
+    lam = 64.0 / np.where(Re > 0, Re, np.inf)
+    ff = lam.copy()
+    dff = -lam / np.where(Re > 0, Re, np.inf)
+    turb = Re > 2000
+    if turb.any():
+        R, e = Re[turb], relrough[turb] / 3.7
+        x = -2.0 * np.log10(e + 5.74 / R**0.9)
+        for _ in range(maxIter):
+            a = e + 2.51 * x / R
+            dx = (x + 2.0 * np.log10(a)) / (1.0 + 2.0 / math.log(10) * 2.51 / (R * a))
+            x -= dx
+            if np.all(np.abs(dx) <= tol * np.abs(x)):
+                break
+        cb = 1.0 / x**2
+        t = np.minimum((R - 2000) / (4000 - 2000), 1.0)
+        ff[turb] = lam[turb] + t * (cb - lam[turb])
+        if derivative:
+            # implicit differentiation of Colebrook: dx/dRe = -(dg/dRe) / (dg/dx)
+            a = e + 2.51 * x / R
+            dgdx = 1.0 + 2.0 / math.log(10) * 2.51 / (R * a)
+            dgdRe = -2.0 / math.log(10) * 2.51 * x / (R**2 * a)
+            dcb = 2.0 / x**3 * dgdRe / dgdx
+            dlam = dff[turb]
+            dff[turb] = dlam + t * (dcb - dlam) + np.where(R < 4000, (cb - lam[turb]) / (4000 - 2000), 0.0)
+    if derivative:
+        return ff.reshape(shape), dff.reshape(shape)
+    return ff.reshape(shape)
 # endregion
 
 # region class definitions
@@ -12,10 +57,78 @@ class Fluid():
         self.rho = rho
         self.nu = mu / rho
 
+class FrictionFactorCache():
+    # Bounded LRU cache of friction factors keyed on relative roughness and Reynolds number.  Re is bucketed
+    # on a log scale of relative width rtol / 2, so a hit is only ever returned for a Re within rtol / 2 of the
+    # one that was solved.  |dln(f)/dln(Re)| is 1 for laminar flow and below 1 for turbulent flow, but the
+    # transitional blend of rough pipes reaches about 1.5 at relrough 0.05 and stays below 2 up to 0.1, so for
+    # pipes in that range the cached f is within rtol of a direct solve.  Pipes with the same roughness and
+    # diameter share entries through relrough.
+    def __init__(self, maxSize=4096, rtol=1e-6):
+        self.maxSize = maxSize
+        self.rtol = rtol
+        self.hits = 0
+        self.misses = 0
+        self._logStep = math.log1p(rtol / 2)
+        self._ff = OrderedDict()
+
+    def key(self, Re, relrough):
+        Re = abs(Re)
+        return (relrough, math.floor(math.log(Re) / self._logStep) if Re > 0 else None)
+
+    def frictionFactor(self, Re, relrough):
+        k = self.key(Re, relrough)
+        ff = self._ff.get(k)
+        if ff is not None:
+            self.hits += 1
+            self._ff.move_to_end(k)
+            return ff
+        self.misses += 1
+        ff = float(frictionFactors(Re, relrough))
+        self._store(k, ff)
+        return ff
+
+    def frictionFactors(self, Re, relrough):
+        # array version: lookups per pipe, one vectorized solve for all the misses
+        Re, relrough = np.broadcast_arrays(np.asarray(Re, dtype=float), np.asarray(relrough, dtype=float))
+        keys = [self.key(R, r) for R, r in zip(Re.tolist(), relrough.tolist())]
+        ff = np.array([self._ff.get(k, np.nan) for k in keys])
+        miss = np.isnan(ff)
+        nMiss = int(miss.sum())
+        self.hits += len(keys) - nMiss
+        self.misses += nMiss
+        for i in np.flatnonzero(~miss):
+            self._ff.move_to_end(keys[i])
+        if nMiss:
+            ff[miss] = frictionFactors(Re[miss], relrough[miss])
+            for i in np.flatnonzero(miss):
+                self._store(keys[i], float(ff[i]))
+        return ff
+
+    def _store(self, k, ff):
+        self._ff[k] = ff
+        self._ff.move_to_end(k)
+        while len(self._ff) > self.maxSize:
+            self._ff.popitem(last=False)
+
+    def hitRate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def clear(self):
+        self._ff.clear()
+        self.hits = 0
+        self.misses = 0
+
+
+# shared by every Pipe
+ffCache = FrictionFactorCache()
+
+
 class Node():
-    def __init__(self, Name='a', Pipes=[], ExtFlow=0):
+    def __init__(self, Name='a', Pipes=None, ExtFlow=0):
         self.name = Name
-        self.pipes = Pipes
+        self.pipes = [] if Pipes is None else Pipes
         self.extFlow = ExtFlow
 
     def getNetFlowRate(self):
@@ -25,56 +138,187 @@ class Node():
         return Qtot
 
 class Loop():
-    def __init__(self, Name='A', Pipes=[]):
+    def __init__(self, Name='A', Pipes=None):
         self.name = Name
-        self.pipes = Pipes
+        self.pipes = [] if Pipes is None else Pipes
 
-    def getLoopHeadLoss(self):
+    def getLoopHeadLoss(self, headLosses=None):
+        # headLosses optionally maps id(pipe) to that pipe's friction head loss
         deltaP = 0
         startNode = self.pipes[0].startNode
         for p in self.pipes:
-            phl = p.getFlowHeadLoss(startNode)
+            phl = p.getFlowHeadLoss(startNode, None if headLosses is None else headLosses[id(p)])
             deltaP += phl
             startNode = p.endNode if startNode != p.endNode else p.startNode
         return deltaP
 
+class PipeTable():
+    # Structure-of-arrays storage for pipes: one contiguous NumPy row per numeric column (lengths and diameters
+    # in m, area, relative roughness, flow, fluid density and viscosity) plus lists of end node names.  Rows
+    # are appended in place with capacity doubling, so a whole-network update is a single slice operation.
+    columns = ('length', 'd', 'r', 'A', 'relrough', 'Q', 'rho', 'mu')
+    _col = {name: i for i, name in enumerate(columns)}
+
+    def __init__(self, capacity=16):
+        self.size = 0
+        self.start = []
+        self.end = []
+        self._data = np.zeros((len(self.columns), max(capacity, 1)))
+
+    def __len__(self):
+        return self.size
+
+    def column(self, name):
+        # a live view of the first self.size entries, valid until the table next grows
+        return self._data[self._col[name], :self.size]
+
+    def get(self, name, i):
+        return self._data[self._col[name], i]
+
+    def set(self, name, i, value):
+        self._data[self._col[name], i] = value
+
+    def _reserve(self, n):
+        if n > self._data.shape[1]:
+            data = np.zeros((len(self.columns), max(n, 2 * self._data.shape[1])))
+            data[:, :self.size] = self._data[:, :self.size]
+            self._data = data
+
+    def extend(self, start, end, length, d, r, Q, rho, mu):
+        # append rows from equal-length columns and return the index of the first one
+        first = self.size
+        n = len(start)
+        self._reserve(first + n)
+        self.start.extend(start)
+        self.end.extend(end)
+        rows = slice(first, first + n)
+        for name, values in (('length', length), ('d', d), ('r', r), ('Q', Q), ('rho', rho), ('mu', mu)):
+            self._data[self._col[name], rows] = values
+        d = self._data[self._col['d'], rows]
+        self._data[self._col['A'], rows] = math.pi / 4.0 * d**2
+        self._data[self._col['relrough'], rows] = self._data[self._col['r'], rows] / d
+        self.size += n
+        return first
+
+    def insertRow(self, i, start, end, values):
+        self._reserve(self.size + 1)
+        if i < self.size:
+            self._data[:, i + 1:self.size + 1] = self._data[:, i:self.size]
+        self._data[:, i] = values
+        self.start.insert(i, start)
+        self.end.insert(i, end)
+        self.size += 1
+
+    def deleteRow(self, i):
+        self._data[:, i:self.size - 1] = self._data[:, i + 1:self.size]
+        del self.start[i], self.end[i]
+        self.size -= 1
+
+    def row(self, i):
+        return self.start[i], self.end[i], self._data[:, i].copy()
+
+    def permute(self, rows):
+        # reorder so that new row k is old row rows[k]
+        self._data[:, :self.size] = self._data[:, rows]
+        self.start = [self.start[i] for i in rows]
+        self.end = [self.end[i] for i in rows]
+
+
 class Pipe():
-    def __init__(self, Start='A', End='B', L=100, D=200, r=0.00025, fluid=Fluid()):
-        self.startNode = min(Start, End)
-        self.endNode = max(Start, End)
-        self.length = L
-        self.r = r
-        self.fluid = fluid
-        self.d = D / 1000.0
-        self.relrough = self.r / self.d
-        self.A = math.pi / 4.0 * self.d**2
-        self.Q = 10
-        self.vel = self.V()
-        self.reynolds = self.Re()
+    # A pipe in a PipeList (e.g. PipeNetwork.pipes) is a view of one row of the list's PipeTable.  A pipe in no
+    # list keeps its end nodes and column values in self._row instead, so creating one allocates no table;
+    # adding it to a list copies them into a new table row and removing it copies them back out.
+    __slots__ = ('_table', '_index', '_row')
+
+    def __init__(self, Start='A', End='B', L=100, D=200, r=0.00025, fluid=None):
+        fluid = Fluid() if fluid is None else fluid
+        d = D / 1000.0
+        self._table, self._index = None, 0
+        # values in PipeTable.columns order
+        self._row = (min(Start, End), max(Start, End), [L, d, r, math.pi / 4.0 * d**2, r / d, 10, fluid.rho, fluid.mu])
+
+    @classmethod
+    def _view(cls, table, index):
+        p = cls.__new__(cls)
+        p._table = table
+        p._index = index
+        p._row = None
+        return p
+
+    def _get(self, name):
+        if self._table is None:
+            return float(self._row[2][PipeTable._col[name]])
+        return float(self._table.get(name, self._index))
+
+    def _set(self, name, value):
+        if self._table is None:
+            self._row[2][PipeTable._col[name]] = value
+        else:
+            self._table.set(name, self._index, value)
+
+    def _column(name):
+        return property(lambda self: self._get(name), lambda self, value: self._set(name, value))
+
+    length = _column('length')
+    Q = _column('Q')
+    A = _column('A')
+    relrough = _column('relrough')
+    del _column
+
+    @property
+    def startNode(self):
+        return self._row[0] if self._table is None else self._table.start[self._index]
+
+    @property
+    def endNode(self):
+        return self._row[1] if self._table is None else self._table.end[self._index]
+
+    @property
+    def d(self):
+        return self._get('d')
+
+    @d.setter
+    def d(self, value):
+        self._set('d', value)
+        self._set('A', math.pi / 4.0 * value**2)
+        self._set('relrough', self.r / value)
+
+    @property
+    def r(self):
+        return self._get('r')
+
+    @r.setter
+    def r(self, value):
+        self._set('r', value)
+        self._set('relrough', value / self.d)
+
+    @property
+    def fluid(self):
+        # a new Fluid built from the stored density and viscosity: changing its attributes does not change the
+        # pipe, so assign a whole Fluid (p.fluid = Fluid(mu, rho)) instead
+        return Fluid(self._get('mu'), self._get('rho'))
+
+    @fluid.setter
+    def fluid(self, fluid):
+        self._set('mu', fluid.mu)
+        self._set('rho', fluid.rho)
+
+    @property
+    def vel(self):
+        return self.V()
+
+    @property
+    def reynolds(self):
+        return self.Re()
 
     def V(self):
         return self.Q / self.A
 
     def Re(self):
-        return self.fluid.rho * self.V() * self.d / self.fluid.mu
+        return self._get('rho') * self.V() * self._get('d') / self._get('mu')
 
     def FrictionFactor(self):
-        def CB(f):
-            return 1 / (f**0.5) + 2.0 * np.log10(self.relrough / 3.7 + 2.51 / (self.Re() * f**0.5))
-
-        def lam():
-            return 64 / self.Re()
-
-        if self.Re() >= 4000:
-            return fsolve(CB, 0.01)[0]
-        if self.Re() <= 2000:
-            return lam()
-
-        CBff = fsolve(CB, 0.01)[0]
-        Lamff = lam()
-        mean = Lamff + ((self.Re() - 2000) / (4000 - 2000)) * (CBff - Lamff)
-        sig = 0.2 * mean
-        return rnd.normalvariate(mean, sig)
+        return ffCache.frictionFactor(self.Re(), self.relrough)
 
     def frictionHeadLoss(self):
         g = 9.81
@@ -82,10 +326,11 @@ class Pipe():
         hl = ff * self.length * self.V()**2 / (2 * g)
         return hl
 
-    def getFlowHeadLoss(self, s):
+    def getFlowHeadLoss(self, s, hl=None):
+        # hl lets the network pass in a head loss it already computed for every pipe at once
         nTraverse = 1 if s == self.startNode else -1
         nFlow = 1 if self.Q >= 0 else -1
-        return nTraverse * nFlow * self.frictionHeadLoss()
+        return nTraverse * nFlow * (self.frictionHeadLoss() if hl is None else hl)
 
     def Name(self):
         return self.startNode + '-' + self.endNode
@@ -102,63 +347,608 @@ class Pipe():
         return self.Q
 
 
+class PipeList(list):
+    # List of pipes backed by one PipeTable (self.table), whose row i always belongs to self[i].  It also keeps
+    # a name index (first pipe with each name, as a linear search would find) and a node adjacency index (node
+    # name -> pipes touching it) up to date as pipes are added or removed.  A pipe can be in one list at a time;
+    # adding one that is in another list raises ValueError, so remove it from there first.
+    def __init__(self, pipes=()):
+        super().__init__()
+        self.table = PipeTable()
+        self.byName = {}
+        self.byNode = {}
+        self.extend(pipes)
+
+    @classmethod
+    def _restore(cls, table, pipes, byName, byNode):
+        # unpickling and deep copying rebuild the list around the copied table and indexes, keeping the
+        # adjacency lists that built nodes share
+        self = cls.__new__(cls)
+        list.extend(self, pipes)
+        self.table, self.byName, self.byNode = table, byName, byNode
+        return self
+
+    def __reduce__(self):
+        return (self._restore, (self.table, list(self), self.byName, self.byNode))
+
+    def _add(self, p, start=None, end=None):
+        start = p.startNode if start is None else start
+        end = p.endNode if end is None else end
+        self.byName.setdefault(start + '-' + end, p)
+        self.byNode.setdefault(start, []).append(p)
+        if end != start:
+            self.byNode.setdefault(end, []).append(p)
+
+    def _drop(self, p):
+        for node in {p.startNode, p.endNode}:
+            self.byNode[node].remove(p)
+        if self.byName.get(p.Name()) is p:
+            del self.byName[p.Name()]
+            for q in self:
+                if q.Name() == p.Name():
+                    self.byName[q.Name()] = q
+                    break
+
+    def _reindex(self, first):
+        for i in range(first, len(self)):
+            list.__getitem__(self, i)._index = i
+
+    def _take(self, p, i):
+        # copy p's values into this table at row i
+        if p._table is self.table:
+            raise ValueError('pipe {} is already in this list'.format(p.Name()))
+        if p._table is not None:
+            raise ValueError('pipe {} is in another pipe list; remove it from there first'.format(p.Name()))
+        self.table.insertRow(i, *p._row)
+        p._table, p._index, p._row = self.table, i, None
+
+    def _release(self, p):
+        # copy p's current values back onto p, which then belongs to no table
+        start, end, values = self.table.row(p._index)
+        self.table.deleteRow(p._index)
+        p._table, p._index, p._row = None, 0, (start, end, values.tolist())
+
+    def append(self, p):
+        self._take(p, len(self))
+        super().append(p)
+        self._add(p)
+
+    def extend(self, pipes):
+        for p in pipes:
+            self.append(p)
+
+    def __iadd__(self, pipes):
+        self.extend(pipes)
+        return self
+
+    def __imul__(self, n):
+        raise TypeError('a PipeList cannot hold the same pipe more than once')
+
+    def sort(self, *, key=None, reverse=False):
+        self._reorder(sorted(self, key=key, reverse=reverse))
+
+    def reverse(self):
+        self._reorder(self[::-1])
+
+    def _reorder(self, pipes):
+        # move the table rows along with the pipes so that row i still belongs to self[i]
+        self.table.permute([p._index for p in pipes])
+        list.__setitem__(self, slice(None), pipes)
+        self._reindex(0)
+        self.byName.clear()
+        for p in self:
+            self.byName.setdefault(p.Name(), p)
+
+    def extendColumns(self, start, end, length, d, r, rho, mu, Q=10.0):
+        # bulk append straight into the table, creating only the thin Pipe views
+        first = self.table.extend(start, end, length, d, r, Q, rho, mu)
+        pipes = [Pipe._view(self.table, i) for i in range(first, self.table.size)]
+        super().extend(pipes)
+        for p, s, e in zip(pipes, start, end):
+            self._add(p, s, e)
+
+    def insert(self, i, p):
+        i = min(max(i + len(self) if i < 0 else i, 0), len(self))
+        self._take(p, i)
+        super().insert(i, p)
+        self._reindex(i + 1)
+        self._add(p)
+
+    def remove(self, p):
+        if not isinstance(p, Pipe) or p._table is not self.table:
+            raise ValueError('PipeList.remove(x): x not in list')
+        self.pop(p._index)
+
+    def pop(self, i=-1):
+        p = super().pop(i)
+        i = p._index
+        self._drop(p)
+        self._release(p)
+        self._reindex(i)
+        return p
+
+    def clear(self):
+        for i in range(len(self) - 1, -1, -1):
+            self._release(list.__getitem__(self, i))
+        super().clear()
+        self.byName.clear()
+        # empty the adjacency lists in place, since built nodes hold them as their pipe lists
+        for pipes in self.byNode.values():
+            pipes.clear()
+
+    def __setitem__(self, i, p):
+        if isinstance(i, slice):
+            raise TypeError('PipeList does not support slice assignment')
+        i = i + len(self) if i < 0 else i
+        self.pop(i)
+        self.insert(i, p)
+
+    def __delitem__(self, i):
+        if isinstance(i, slice):
+            raise TypeError('PipeList does not support slice deletion')
+        self.pop(i)
+
+
+class NodeList(list):
+    # List of nodes with a name index (first node with each name) kept up to date as nodes are added or removed.
+    def __init__(self, nodes=()):
+        super().__init__()
+        self.byName = {}
+        self.extend(nodes)
+
+    def __reduce__(self):
+        # rebuild through __init__ so the name index exists before any node is added
+        return (self.__class__, (list(self),))
+
+    def append(self, n):
+        super().append(n)
+        self.byName.setdefault(n.name, n)
+
+    def extend(self, nodes):
+        for n in nodes:
+            self.append(n)
+
+    def __iadd__(self, nodes):
+        self.extend(nodes)
+        return self
+
+    def sort(self, *, key=None, reverse=False):
+        super().sort(key=key, reverse=reverse)
+        self._reindexNames()
+
+    def reverse(self):
+        super().reverse()
+        self._reindexNames()
+
+    def _reindexNames(self):
+        self.byName.clear()
+        for n in self:
+            self.byName.setdefault(n.name, n)
+
+    def insert(self, i, n):
+        super().insert(i, n)
+        self.byName.setdefault(n.name, n)
+
+    def _drop(self, n):
+        if self.byName.get(n.name) is n:
+            del self.byName[n.name]
+            for m in self:
+                if m.name == n.name:
+                    self.byName[m.name] = m
+                    break
+
+    def remove(self, n):
+        super().remove(n)
+        self._drop(n)
+
+    def pop(self, i=-1):
+        n = super().pop(i)
+        self._drop(n)
+        return n
+
+    def clear(self):
+        super().clear()
+        self.byName.clear()
+
+    def __setitem__(self, i, n):
+        if isinstance(i, slice):
+            raise TypeError('NodeList does not support slice assignment')
+        old = self[i]
+        super().__setitem__(i, n)
+        self._drop(old)
+        self.byName.setdefault(n.name, n)
+
+    def __delitem__(self, i):
+        if isinstance(i, slice):
+            raise TypeError('NodeList does not support slice deletion')
+        self.pop(i)
+
+
+class CompiledNetwork():
+    # Array form of a PipeNetwork for residual evaluation.  Per-pipe constants live in NumPy columns, node
+    # continuity is a sparse node-pipe incidence matrix (+1 where a pipe ends at the node, -1 where it starts)
+    # and loop head loss is a sparse loop-pipe matrix (+1 for a pipe traversed start to end, -1 against), so
+    # residuals are  incidence @ Q + extFlow  and  loopMatrix @ (sign(Q) * hl(Q)).  With matrices=False only the
+    # per-pipe columns are built, which is all the friction factor and head loss methods need.
+    def __init__(self, network, matrices=True):
+        g = 9.81
+        pipes = network.pipes
+        table = pipes.table
+        self.nPipes = len(pipes)
+        self.length = table.column('length').copy()
+        self.area = table.column('A').copy()
+        self.relrough = table.column('relrough').copy()
+        self.reynoldsPerFlow = table.column('rho') * table.column('d') / (table.column('mu') * self.area)
+        self.lossCoeff = self.length / (2 * g * self.area**2)
+        self.ffCache = network.ffCache
+        if not matrices:
+            self.nodeNames = self.incidence = self.loopMatrix = None
+            return
+
+        self.nodeNames = [n.name for n in network.nodes]
+        nodeIndex = {name: i for i, name in enumerate(self.nodeNames)}
+        rows = np.array([nodeIndex.get(name, -1) for name in table.start + table.end], dtype=np.intp)
+        cols = np.tile(np.arange(self.nPipes), 2)
+        vals = np.repeat([-1.0, 1.0], self.nPipes)
+        known = rows >= 0
+        self.incidence = sparse.csr_matrix((vals[known], (rows[known], cols[known])),
+                                           shape=(len(self.nodeNames), self.nPipes))
+
+        pipeIndex = {id(p): j for j, p in enumerate(pipes)}
+        rows, cols, vals = [], [], []
+        for r, l in enumerate(network.loops):
+            startNode = l.pipes[0].startNode
+            for p in l.pipes:
+                rows.append(r)
+                cols.append(pipeIndex[id(p)])
+                vals.append(1.0 if startNode == p.startNode else -1.0)
+                startNode = p.endNode if startNode != p.endNode else p.startNode
+        self.loopMatrix = sparse.csr_matrix((vals, (rows, cols)), shape=(len(network.loops), self.nPipes))
+
+    def withoutPipes(self, openPipes):
+        # Copy restricted to the pipes where the boolean mask openPipes is True, e.g. with closed pipes removed.
+        # Loops do not survive removing pipes, so the copy has no loop rows and can only be solved by GGA.
+        openPipes = np.asarray(openPipes, dtype=bool)
+        reduced = copy.copy(self)
+        for name in ('length', 'area', 'relrough', 'reynoldsPerFlow', 'lossCoeff'):
+            setattr(reduced, name, getattr(self, name)[openPipes])
+        reduced.nPipes = int(openPipes.sum())
+        reduced.incidence = self.incidence[:, openPipes].tocsr()
+        reduced.loopMatrix = sparse.csr_matrix((0, reduced.nPipes))
+        return reduced
+
+    def frictionFactors(self, Q):
+        Re = self.reynoldsPerFlow * Q
+        if self.ffCache is not None:
+            return self.ffCache.frictionFactors(Re, self.relrough)
+        return frictionFactors(Re, self.relrough)
+
+    def headLosses(self, Q):
+        return self.frictionFactors(Q) * self.lossCoeff * Q**2
+
+    def headLossDerivatives(self, Q):
+        # d(head loss)/d|Q|: hl = f(Re) L Q^2 / (2 g A^2) with Re proportional to |Q|
+        q = np.maximum(np.abs(Q), 1e-12)
+        k = self.reynoldsPerFlow
+        ff, dff = frictionFactors(k * q, self.relrough, derivative=True)
+        return self.lossCoeff * (dff * k * q**2 + 2 * ff * q)
+
+    def residual(self, Q, extFlow):
+        return np.concatenate((self.incidence @ Q + extFlow, self.loopMatrix @ (np.sign(Q) * self.headLosses(Q))))
+
+    def jacobian(self, Q):
+        # sparse; loop rows are the traversal sign times d(head loss)/dQ, the same for either flow direction
+        return sparse.vstack((self.incidence, self.loopMatrix.multiply(self.headLossDerivatives(Q)))).tocsr()
+
+    def freeNodes(self):
+        # boolean mask over nodes that leaves out the first node of each connected part of the network; that
+        # node's continuity equation follows from the others, and its head is the reference for the rest
+        nParts, part = connected_components(self.incidence @ self.incidence.T, directed=False)
+        free = np.ones(len(part), dtype=bool)
+        free[np.unique(part, return_index=True)[1]] = False
+        return free
+
+    def solveGlobalGradient(self, extFlow, Q0=None, H0=None, tol=1e-9, maxIter=100):
+        # Global gradient (Todini-Pilati) solution for pipe flows Q and node heads H together, without loops:
+        #   energy      sign(Q) hl(Q) + A H = 0   (A = incidence.T, so A H = H_end - H_start)
+        #   continuity  A.T Q + extFlow = 0
+        # Each Newton step eliminates dQ and solves the sparse symmetric system (A.T D^-1 A) dH = F2 - A.T D^-1 F1
+        # with D = d(hl)/dQ.  Heads are relative: one node per connected part of the network is held at 0.
+        A = self.incidence.T.tocsr()
+        nNodes = A.shape[1]
+        Q = np.full(self.nPipes, 10.0) if Q0 is None else np.array(Q0, dtype=float)
+        H = np.zeros(nNodes) if H0 is None else np.array(H0, dtype=float)
+        free = self.freeNodes()
+        H[~free] = 0.0
+        Af = A[:, free]
+
+        residual = np.inf
+        for iteration in range(1, maxIter + 1):
+            F1 = np.sign(Q) * self.headLosses(Q) + A @ H
+            F2 = A.T @ Q + extFlow
+            Dinv = 1.0 / self.headLossDerivatives(Q)
+            M = (Af.T @ sparse.diags(Dinv) @ Af).tocsc()
+            dH = np.atleast_1d(spsolve(M, (F2 - A.T @ (Dinv * F1))[free]))
+            H[free] += dH
+            dQ = -Dinv * (F1 + Af @ dH)
+            Q += dQ
+            residual = max(np.max(np.abs(np.sign(Q) * self.headLosses(Q) + A @ H), initial=0.0),
+                           np.max(np.abs(A.T @ Q + extFlow), initial=0.0))
+            if residual <= tol:
+                break
+        return Q, H, iteration, residual
+
+
 class PipeNetwork():
-    def __init__(self, Pipes=[], Loops=[], Nodes=[], fluid=Fluid()):
-        self.loops = Loops
-        self.nodes = Nodes
-        self.Fluid = fluid
-        self.pipes = Pipes
+    def __init__(self, Pipes=None, Loops=None, Nodes=None, fluid=None):
+        self.loops = [] if Loops is None else Loops
+        self.nodes = [] if Nodes is None else Nodes
+        self.Fluid = Fluid() if fluid is None else fluid
+        self.pipes = [] if Pipes is None else Pipes
+        # set to a FrictionFactorCache (e.g. ffCache) to reuse friction factors between residual evaluations
+        self.ffCache = None
+        self.solveInfo = None
 
-    def findFlowRates(self):
-        N = len(self.nodes) + len(self.loops)
-        Q0 = np.full(N, 10)
+    # pipes and nodes are always held in indexed lists, whatever sequence is assigned to them
+    @property
+    def pipes(self):
+        return self._pipes
 
-        def fn(q):
-            for i in range(len(self.pipes)):
-                self.pipes[i].Q = q[i]
-            L = self.getNodeFlowRates() + self.getLoopHeadLosses()
-            return L
+    @pipes.setter
+    def pipes(self, pipes):
+        self._pipes = pipes if isinstance(pipes, PipeList) else PipeList(pipes)
+
+    @property
+    def nodes(self):
+        return self._nodes
+
+    @nodes.setter
+    def nodes(self, nodes):
+        self._nodes = nodes if isinstance(nodes, NodeList) else NodeList(nodes)
+
+    def compile(self, matrices=True):
+        return CompiledNetwork(self, matrices)
 
-        FR = fsolve(fn, Q0)
+    def buildLoops(self):
+        # Derive an independent set of loops from the pipe graph and use it as self.loops.  A breadth-first
+        # spanning forest is grown in O(pipes + nodes); every pipe left out of it closes exactly one
+        # fundamental loop, formed by that pipe and the tree paths from its two ends to their common ancestor.
+        adjacency = {n: [p for p in pipes if p.startNode != p.endNode] for n, pipes in self.pipes.byNode.items()}
+
+        parentPipe, depth, treePipes = {}, {}, set()
+        for root in adjacency:
+            if root in depth:
+                continue
+            depth[root] = 0
+            parentPipe[root] = None
+            queue = deque([root])
+            while queue:
+                n = queue.popleft()
+                for p in adjacency[n]:
+                    other = p.endNode if n == p.startNode else p.startNode
+                    if other not in depth:
+                        depth[other] = depth[n] + 1
+                        parentPipe[other] = p
+                        treePipes.add(id(p))
+                        queue.append(other)
+
+        def up(n):
+            p = parentPipe[n]
+            return p, (p.endNode if n == p.startNode else p.startNode)
+
+        self.loops = []
+        for p in self.pipes:
+            if id(p) in treePipes or p.startNode == p.endNode:
+                continue
+            # walk both ends up to their common ancestor
+            u, v = p.startNode, p.endNode
+            fromU, fromV = [], []
+            while u != v:
+                if depth[u] >= depth[v]:
+                    q, u = up(u)
+                    fromU.append(q)
+                else:
+                    q, v = up(v)
+                    fromV.append(q)
+            # traverse p from its start node, back up from its end node, then down to the start node
+            self.loops.append(Loop('L{}'.format(len(self.loops) + 1), [p] + fromV + fromU[::-1]))
+        return self.loops
+
+    def findFlowRates(self, method='fsolve', Q0=None, tol=1e-9):
+        # method 'fsolve' solves the node and loop equations; 'gga' uses the global gradient algorithm, which
+        # needs no loops.  Either way the pipe flows are returned and self.solveInfo reports how it went.
+        # Q0 is an optional starting guess for the pipe flows.
+        # tol is the largest residual gga accepts as converged; fsolve uses its own stopping test.
+        if method == 'fsolve' and len(self.loops) == 0:
+            self.buildLoops()
+        extFlow = np.array([n.extFlow for n in self.nodes], dtype=float)
+        FR, self.solveInfo = self._solve(self.compile(), extFlow, method, Q0, tol=tol)
+        self.setFlows(FR[:len(self.pipes)])
         return FR
 
+    def _solve(self, net, extFlow, method, Q0=None, H0=None, tol=1e-9):
+        P = net.nPipes
+        if method == 'gga':
+            Q, H, iterations, residual = net.solveGlobalGradient(extFlow, None if Q0 is None else Q0[:P], H0, tol=tol)
+            return Q, {'method': method, 'iterations': iterations, 'residual': float(residual),
+                       'converged': bool(residual <= tol), 'heads': H}
+        if method != 'fsolve':
+            raise ValueError('unknown solver method {!r}'.format(method))
+
+        # One continuity equation per connected part of the network follows from the others, so it is left out;
+        # with a complete set of loops that leaves a square system in the pipe flows with a nonsingular Jacobian.
+        rows = np.concatenate((np.flatnonzero(net.freeNodes()), len(net.nodeNames) + np.arange(len(self.loops))))
+        if len(rows) != P:
+            raise ValueError('{} independent node equations and {} loops do not determine {} pipe flows; '
+                             'buildLoops() derives a complete set of loops'.format(len(rows) - len(self.loops),
+                                                                                 len(self.loops), P))
+        start = np.full(P, 10.0) if Q0 is None else np.array(Q0[:P], dtype=float)
+
+        def fn(q):
+            return net.residual(q, extFlow)[rows]
+
+        def jac(q):
+            return net.jacobian(q)[rows].toarray()
+
+        # head losses run to 1e5 m, so fsolve's default xtol of 1.5e-8 would stop with loop residuals near 1e-3 m
+        FR, info, ier, msg = fsolve(fn, start, fprime=jac, full_output=True, xtol=1e-12)
+        # the residual includes the equations left out, which only hold if each part's demands balance
+        # fsolve reports residual evaluations rather than iterations, which are not comparable with gga's
+        return FR, {'method': method, 'evaluations': info['nfev'],
+                    'residual': float(np.max(np.abs(net.residual(FR, extFlow)), initial=0.0)), 'converged': ier == 1}
+
+    def simulate(self, schedule, method='gga', tol=1e-9):
+        # Extended-period simulation: the pipes stay fixed and only node demands change from step to step.
+        # schedule is either a mapping of node name -> sequence of extFlow values (nodes left out keep their
+        # current extFlow) or an array of shape (steps, len(self.nodes)) in node order.  The network is compiled
+        # once and each step is warm-started from the previous solution.  Yields (step, flows, solveInfo) as
+        # each step is solved; node extFlow and pipe flows are left at the latest step.  A step that does not
+        # converge is yielded with solveInfo['converged'] False and ends the simulation, since later steps would
+        # start from its flows.
+        if method == 'fsolve' and len(self.loops) == 0:
+            self.buildLoops()
+        net = self.compile()
+        base = np.array([n.extFlow for n in self.nodes], dtype=float)
+        if hasattr(schedule, 'items'):
+            nodeIndex = {n.name: i for i, n in enumerate(self.nodes)}
+            steps = max((len(v) for v in schedule.values()), default=0)
+            demands = np.tile(base, (steps, 1))
+            for name, values in schedule.items():
+                if name not in nodeIndex:
+                    raise ValueError('schedule given for unknown node {!r}'.format(name))
+                demands[:, nodeIndex[name]] = values
+        else:
+            demands = np.asarray(schedule, dtype=float)
+            if demands.ndim != 2 or demands.shape[1] != len(self.nodes):
+                raise ValueError('schedule must have shape (steps, {})'.format(len(self.nodes)))
+
+        FR, H = None, None
+        for step, extFlow in enumerate(demands):
+            FR, info = self._solve(net, extFlow, method, FR, H, tol)
+            H = info.get('heads')
+            for n, q in zip(self.nodes, extFlow):
+                n.extFlow = float(q)
+            self.setFlows(FR[:net.nPipes])
+            self.solveInfo = info
+            yield step, FR[:net.nPipes].copy(), info
+            if not info['converged']:
+                return
+
+    def solveScenarios(self, scenarios, processes=None, chunksize=8):
+        # Solve the network under many independent scenarios with GGA, leaving the network itself untouched.
+        # Each scenario is a dict with optional 'demands' (node name -> extFlow, other nodes keep their current
+        # extFlow) and 'closed' (names of pipes taken out of service).  The compiled network is sent to each
+        # worker process once; processes=1 solves in this process.  Returns (flows, status): flows has shape
+        # (len(scenarios), len(self.pipes)) with zero flow in closed pipes, status is a SCENARIO_DTYPE array.
+        net = self.compile()
+        nodeIndex = {n.name: i for i, n in enumerate(self.nodes)}
+        base = np.array([n.extFlow for n in self.nodes], dtype=float)
+        Q0 = self.getFlows()
+        jobs = []
+        for scenario in scenarios:
+            extFlow = base.copy()
+            for name, q in scenario.get('demands', {}).items():
+                if name not in nodeIndex:
+                    raise ValueError('demand given for unknown node {!r}'.format(name))
+                extFlow[nodeIndex[name]] = q
+            openPipes = np.ones(net.nPipes, dtype=bool)
+            for name in scenario.get('closed', ()):
+                p = self.getPipe(name)
+                if p is None:
+                    raise ValueError('unknown pipe {!r} in closed pipes'.format(name))
+                openPipes[p._index] = False
+            jobs.append((extFlow, openPipes, Q0))
+
+        if processes == 1 or len(jobs) <= 1:
+            results = [_solveScenario(net, *job) for job in jobs]
+        else:
+            from concurrent.futures import ProcessPoolExecutor
+
+            with ProcessPoolExecutor(max_workers=processes, initializer=_initScenarioWorker, initargs=(net,)) as pool:
+                results = list(pool.map(_solveScenarioInWorker, jobs, chunksize=chunksize))
+
+        flows = np.zeros((len(jobs), net.nPipes))
+        status = np.zeros(len(jobs), dtype=SCENARIO_DTYPE)
+        for k, (Q, converged, iterations, residual) in enumerate(results):
+            flows[k, jobs[k][1]] = Q
+            status[k] = (converged, iterations, residual)
+        return flows, status
+
+    def addPipes(self, start, end, length, diameter, roughness, fluid=None):
+        # Bulk counterpart of self.pipes.append(Pipe(...)) for equal-length columns; diameter in mm as for Pipe
+        fluid = self.Fluid if fluid is None else fluid
+        start, end = np.asarray(start, dtype=str), np.asarray(end, dtype=str)
+        swap = start > end
+        startNodes = np.where(swap, end, start).tolist()
+        endNodes = np.where(swap, start, end).tolist()
+        self.pipes.extendColumns(startNodes, endNodes, length, np.asarray(diameter, dtype=float) / 1000.0, roughness,
+                                 fluid.rho, fluid.mu)
+
+    def buildNetworkFromFile(self, filename, chunkSize=65536):
+        # Replace the pipes, nodes and loops with the network described in filename (see readNetworkFile)
+        data = readNetworkFile(filename, chunkSize)
+        self.pipes, self.nodes, self.loops = [], [], []
+        self.addPipes(**data['pipes'])
+        self.buildNodes()
+        for name, q in zip(data['demands']['node'].tolist(), data['demands']['extFlow'].tolist()):
+            node = self.getNode(name)
+            if node is None:
+                raise ValueError('{}: demand given for node {} which no pipe connects'.format(filename, name))
+            node.extFlow = q
+
+    def getFlows(self):
+        return self.pipes.table.column('Q').copy()
+
+    def setFlows(self, Q):
+        Q = np.asarray(Q, dtype=float)
+        n = min(len(Q), len(self.pipes))
+        self.pipes.table.column('Q')[:n] = Q[:n]
+
+    def getJacobian(self, N=None):
+        # Derivatives of the findFlowRates residuals with respect to the pipe flows, at the current flows
+        N = len(self.pipes) if N is None else N
+        J = np.zeros((len(self.nodes) + len(self.loops), N))
+        J[:, :len(self.pipes)] = self.compile().jacobian(self.getFlows()).toarray()
+        return J
+
     def getNodeFlowRates(self):
         qNet = [n.getNetFlowRate() for n in self.nodes]
         return qNet
 
     def getLoopHeadLosses(self):
-        lhl = [l.getLoopHeadLoss() for l in self.loops]
+        hl = dict(zip(map(id, self.pipes), self.getPipeHeadLosses()))
+        lhl = [l.getLoopHeadLoss(hl) for l in self.loops]
         return lhl
 
+    def getFrictionFactors(self):
+        # friction factors of every pipe from one vectorized Colebrook solve
+        return self.compile(matrices=False).frictionFactors(self.getFlows())
+
+    def getHeadLossDerivatives(self):
+        return self.compile(matrices=False).headLossDerivatives(self.getFlows())
+
+    def getPipeHeadLosses(self):
+        return self.compile(matrices=False).headLosses(self.getFlows())
+
     def getPipe(self, name):
-        for p in self.pipes:
-            if name == p.Name():
-                return p
+        return self.pipes.byName.get(name)
 
     def getNodePipes(self, node):
-        l = []
-        for p in self.pipes:
-            if p.oContainsNode(node):
-                l.append(p)
-        return l
+        return list(self.pipes.byNode.get(node, ()))
 
     def nodeBuilt(self, node):
-        for n in self.nodes:
-            if n.name == node:
-                return True
-        return False
+        return node in self.nodes.byName
 
     def getNode(self, name):
-        for n in self.nodes:
-            if n.name == name:
-                return n
+        return self.nodes.byName.get(name)
 
     def buildNodes(self):
-        for p in self.pipes:
-            if not self.nodeBuilt(p.startNode):
-                self.nodes.append(Node(p.startNode, self.getNodePipes(p.startNode)))
-            if not self.nodeBuilt(p.endNode):
-                self.nodes.append(Node(p.endNode, self.getNodePipes(p.endNode)))
+        # each new node shares the live adjacency list, so it sees pipes added or removed later
+        table = self.pipes.table
+        for ends in zip(table.start, table.end):
+            for name in ends:
+                if not self.nodeBuilt(name):
+                    self.nodes.append(Node(name, self.pipes.byNode[name]))
 
     def printPipeFlowRates(self):
         for p in self.pipes:
@@ -176,6 +966,95 @@ class PipeNetwork():
 # endregion
 
 # region function definitions
+# columns of each section of a pipe network file, with None for text columns and a dtype for numeric ones
+NETWORK_FILE_SECTIONS = {
+    'pipes': (('start', None), ('end', None), ('length', float), ('diameter', float), ('roughness', float)),
+    'demands': (('node', None), ('extFlow', float)),
+}
+
+
+def readNetworkFile(filename, chunkSize=65536):
+    # Stream a pipe network file (see PipeNetwork.txt for the layout) into column arrays.  Records are gathered
+    # chunkSize lines at a time and each chunk is parsed by np.loadtxt into one string array, whose columns are
+    # then converted whole, so no per-record lists or tuples are built.  Text after # or ; is a comment, on
+    # record and section lines alike.  Returns {'pipes': {column: array}, 'demands': {column: array}}.
+    parts = {section: [] for section in NETWORK_FILE_SECTIONS}
+
+    def fieldCount(line):
+        return len(line.split('#')[0].split(';')[0].split())
+
+    def flush(section, lines, lineNums):
+        if not lines:
+            return
+        columns = NETWORK_FILE_SECTIONS[section]
+        try:
+            fields = np.loadtxt(lines, dtype=str, comments=('#', ';'), ndmin=2)
+        except ValueError:
+            fields = None
+        if fields is None or fields.shape[1] != len(columns):
+            for line, lineNum in zip(lines, lineNums):
+                if fieldCount(line) != len(columns):
+                    raise ValueError('{}:{}: expected {} fields in [{}], got {}'.format(
+                        filename, lineNum, len(columns), section.upper(), fieldCount(line)))
+        chunk = []
+        for i, (name, dtype) in enumerate(columns):
+            try:
+                chunk.append(fields[:, i] if dtype is None else fields[:, i].astype(dtype))
+            except ValueError as e:
+                raise ValueError('{}:{}-{}: bad {} in [{}]: {}'.format(
+                    filename, lineNums[0], lineNums[-1], name, section.upper(), e)) from None
+        parts[section].append(chunk)
+        del lines[:], lineNums[:]
+
+    section, lines, lineNums = None, [], []
+    with open(filename, 'r') as f:
+        for lineNum, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line[0] in '#;':
+                continue
+            if line[0] == '[':
+                flush(section, lines, lineNums)
+                section = line[1:line.find(']')].strip().lower() if ']' in line else None
+                if section not in NETWORK_FILE_SECTIONS:
+                    raise ValueError('{}:{}: unknown section {}'.format(filename, lineNum, line))
+                continue
+            if section is None:
+                raise ValueError('{}:{}: record outside of a section'.format(filename, lineNum))
+            lines.append(line)
+            lineNums.append(lineNum)
+            if len(lines) >= chunkSize:
+                flush(section, lines, lineNums)
+        flush(section, lines, lineNums)
+
+    data = {}
+    for section, columns in NETWORK_FILE_SECTIONS.items():
+        chunks = parts[section]
+        data[section] = {name: np.concatenate([c[i] for c in chunks]) if chunks else
+                         np.empty(0, dtype=str if dtype is None else dtype)
+                         for i, (name, dtype) in enumerate(columns)}
+    return data
+
+
+# compiled network held by each solveScenarios worker process, set once by the pool initializer
+_scenarioNet = None
+
+
+def _initScenarioWorker(net):
+    global _scenarioNet
+    _scenarioNet = net
+
+
+def _solveScenarioInWorker(job):
+    return _solveScenario(_scenarioNet, *job)
+
+
+def _solveScenario(net, extFlow, openPipes, Q0, tol=1e-9):
+    if not openPipes.all():
+        net = net.withoutPipes(openPipes)
+    Q, H, iterations, residual = net.solveGlobalGradient(extFlow, Q0[openPipes], tol=tol)
+    return Q, bool(residual <= tol), iterations, float(residual)
+
+
 def main():
     water = Fluid()
     roughness = 0.00025
@@ -0,0 +1,308 @@
+import copy
+import os
+import pickle
+import tempfile
+
+import numpy as np
+
+from HW6_2_OOP import FrictionFactorCache, Loop, Pipe, PipeNetwork, frictionFactors, readNetworkFile
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def exampleNetwork():
+    # the network of main(), with its hand-written loops
+    PN = PipeNetwork()
+    for start, end, L, D in (('a', 'b', 250, 300), ('a', 'c', 100, 200), ('b', 'e', 100, 200), ('c', 'd', 125, 200),
+                             ('c', 'f', 100, 150), ('d', 'e', 125, 200), ('d', 'g', 100, 150), ('e', 'h', 100, 150),
+                             ('f', 'g', 125, 250), ('g', 'h', 125, 250)):
+        PN.pipes.append(Pipe(start, end, L, D, 0.00025))
+    PN.buildNodes()
+    for name, q in (('a', 60), ('d', -30), ('f', -15), ('h', -15)):
+        PN.getNode(name).extFlow = q
+    PN.loops.append(Loop('A', [PN.getPipe(n) for n in ('a-b', 'b-e', 'd-e', 'c-d', 'a-c')]))
+    PN.loops.append(Loop('B', [PN.getPipe(n) for n in ('c-d', 'd-g', 'f-g', 'c-f')]))
+    PN.loops.append(Loop('C', [PN.getPipe(n) for n in ('d-e', 'e-h', 'g-h', 'd-g')]))
+    return PN
+
+
+def gridNetwork(n, seed=0):
+    # an n x n grid of pipes fed at one corner and drawn off at two others, plus a separate two-pipe triangle
+    rng = np.random.default_rng(seed)
+    name = 'n{:02d}_{:02d}'.format
+    PN = PipeNetwork()
+    for i in range(n):
+        for j in range(n):
+            for k, l in ((i + 1, j), (i, j + 1)):
+                if k < n and l < n:
+                    PN.pipes.append(Pipe(name(i, j), name(k, l), 100, rng.uniform(150, 300)))
+    for start, end in (('x', 'y'), ('y', 'z'), ('x', 'z')):
+        PN.pipes.append(Pipe(start, end, 50, 100))
+    PN.buildNodes()
+    PN.getNode(name(0, 0)).extFlow = 1.0
+    PN.getNode(name(n - 1, n - 1)).extFlow = -0.6
+    PN.getNode(name(0, n - 1)).extFlow = -0.4
+    return PN
+
+
+def test_colebrook():
+    Re = np.logspace(np.log10(4000), 8, 50)
+    for relrough in (0.0, 1e-5, 1e-3, 0.05):
+        f = frictionFactors(Re, relrough)
+        residual = 1 / np.sqrt(f) + 2.0 * np.log10(relrough / 3.7 + 2.51 / (Re * np.sqrt(f)))
+        assert np.max(np.abs(residual)) < 1e-10
+
+
+def test_cache_stays_within_rtol_of_direct_solves():
+    # Re pairs a hair apart share a bucket, across laminar, transitional and turbulent flow
+    rng = np.random.default_rng(3)
+    for rtol in (1e-6, 1e-3):
+        cache = FrictionFactorCache(maxSize=100000, rtol=rtol)
+        for relrough in (0.0, 1e-3, 0.05):
+            for low, high in ((100, 2000), (2000, 4000), (4000, 1e8)):
+                Re = np.exp(rng.uniform(np.log(low), np.log(high), 2000))
+                Re = np.concatenate((Re, Re * (1 + rng.uniform(-rtol, rtol, Re.size))))
+                direct = frictionFactors(Re, relrough)
+                cached = cache.frictionFactors(Re, relrough)
+                assert np.max(np.abs(cached / direct - 1)) <= rtol
+                assert all(abs(cache.frictionFactor(R, relrough) / f - 1) <= rtol for R, f in zip(Re[:50], direct))
+        assert cache.hits > 0
+
+
+def test_jacobian_matches_central_differences():
+    PN = exampleNetwork()
+    PN.findFlowRates()
+    net = PN.compile()
+    extFlow = np.array([n.extFlow for n in PN.nodes], dtype=float)
+    Q = PN.getFlows() * np.random.default_rng(1).uniform(0.5, 1.5, net.nPipes)
+    J = net.jacobian(Q).toarray()
+    numeric = np.zeros_like(J)
+    for j in range(net.nPipes):
+        h = 1e-6 * max(1.0, abs(Q[j]))
+        dQ = np.zeros(net.nPipes)
+        dQ[j] = h
+        numeric[:, j] = (net.residual(Q + dQ, extFlow) - net.residual(Q - dQ, extFlow)) / (2 * h)
+    assert np.max(np.abs(J - numeric)) <= 1e-8 * max(1.0, np.max(np.abs(J)))
+
+
+def test_built_loops_are_closed_and_independent():
+    PN = gridNetwork(6)
+    PN.buildLoops()
+    net = PN.compile()
+    components = 2
+    assert len(PN.loops) == len(PN.pipes) - len(PN.nodes) + components
+    assert np.linalg.matrix_rank(net.loopMatrix.toarray()) == len(PN.loops)
+    # walking a closed loop enters every node as often as it leaves it
+    assert abs(net.incidence @ net.loopMatrix.T).max() == 0
+
+
+def test_built_loops_reproduce_hand_written_loops():
+    hand = exampleNetwork()
+    hand.findFlowRates()
+    built = exampleNetwork()
+    built.loops = []
+    built.findFlowRates()
+    assert np.max(np.abs(hand.getFlows() - built.getFlows())) < 1e-9
+
+
+def test_gga_matches_fsolve():
+    for PN, other in ((exampleNetwork(), exampleNetwork()), (gridNetwork(6), gridNetwork(6))):
+        PN.findFlowRates('fsolve')
+        other.findFlowRates('gga')
+        assert PN.solveInfo['converged'] and other.solveInfo['converged']
+        assert PN.solveInfo['evaluations'] > 0 and other.solveInfo['iterations'] > 0
+        assert other.solveInfo['residual'] <= 1e-9
+        assert np.max(np.abs(PN.getFlows() - other.getFlows())) < 1e-8
+
+
+def test_fsolve_converges_over_demand_sets():
+    # the inflow at a is drawn off at d, f and h in random proportions
+    rng = np.random.default_rng(2)
+    demands = [(50, -20, -15, -15)]
+    for a in rng.uniform(5, 100, 30):
+        demands.append((a, *(-a * rng.dirichlet([1, 1, 1]))))
+    for extFlows in demands:
+        PN, other = exampleNetwork(), exampleNetwork()
+        for net in (PN, other):
+            for name, q in zip('adfh', extFlows):
+                net.getNode(name).extFlow = q
+        PN.findFlowRates('fsolve')
+        other.findFlowRates('gga')
+        assert PN.solveInfo['converged'] and PN.solveInfo['residual'] < 1e-6 * extFlows[0] ** 2
+        assert np.max(np.abs(PN.getFlows() - other.getFlows())) < 1e-8 * extFlows[0]
+
+
+def test_simulate_matches_cold_solves():
+    schedule = {'a': [60, 50, 40], 'd': [-30, -20, -10]}
+    for method in ('gga', 'fsolve'):
+        PN = exampleNetwork()
+        steps = list(PN.simulate(schedule, method=method))
+        assert [step for step, flows, info in steps] == [0, 1, 2]
+        for step, flows, info in steps:
+            assert info['converged']
+            cold = exampleNetwork()
+            cold.getNode('a').extFlow = schedule['a'][step]
+            cold.getNode('d').extFlow = schedule['d'][step]
+            cold.findFlowRates('gga')
+            assert np.max(np.abs(flows - cold.getFlows())) < 1e-8
+        assert PN.getNode('a').extFlow == 40 and np.array_equal(PN.getFlows(), steps[-1][1])
+
+
+def test_simulate_stops_at_a_step_that_does_not_converge():
+    PN = exampleNetwork()
+    steps = list(PN.simulate({'a': [60, 50, 40], 'd': [-30, -20, -10]}, tol=0.0))
+    assert len(steps) == 1 and not steps[0][2]['converged']
+    try:
+        list(PN.simulate({'z': [1.0]}))
+        assert False, 'a schedule for an unknown node was accepted'
+    except ValueError:
+        pass
+
+
+def test_pickled_network_is_independent_copy():
+    PN = exampleNetwork()
+    PN.findFlowRates()
+    clone = pickle.loads(pickle.dumps(PN))
+    assert np.array_equal(clone.getFlows(), PN.getFlows())
+    assert clone.getNode('a').pipes is clone.pipes.byNode['a']
+    assert clone.loops[0].pipes[0] is clone.getPipe('a-b')
+    clone.setFlows(np.zeros(len(clone.pipes)))
+    assert PN.getFlows()[0] != 0 and clone.getPipe('a-b').Q == 0
+
+
+def test_indexes_follow_list_changes():
+    PN = exampleNetwork()
+    a = PN.getNode('a')
+    PN.pipes += [Pipe('h', 'z', 100, 200)]
+    assert PN.getPipe('h-z') is PN.pipes[-1]
+    PN.buildNodes()
+    assert PN.getNode('z').pipes == [PN.pipes[-1]]
+    PN.pipes.clear()
+    assert a.pipes == [] and PN.getPipe('a-b') is None
+    PN.pipes.append(Pipe('a', 'q', 10, 100))
+    assert a.pipes == [PN.pipes[0]]
+
+
+def test_pipe_rows_follow_their_pipes():
+    PN = exampleNetwork()
+    PN.findFlowRates()
+    flows = {p.Name(): p.Q for p in PN.pipes}
+    clone = copy.deepcopy(PN)
+    assert np.array_equal(clone.getFlows(), PN.getFlows())
+    try:
+        PipeNetwork(Pipes=list(PN.pipes))
+        assert False, 'a pipe was taken from another network'
+    except ValueError:
+        pass
+    PN.pipes.sort(key=lambda p: p.Q)
+    PN.pipes.reverse()
+    PN.pipes.insert(0, PN.pipes.pop(4))
+    assert [flows[p.Name()] for p in PN.pipes] == PN.getFlows().tolist()
+    assert all(p._index == i for i, p in enumerate(PN.pipes))
+
+
+def test_pipe_keeps_its_values_outside_a_list():
+    p = Pipe('b', 'a', 100, 200)
+    p.Q = 0.5
+    p.d = 0.25
+    assert p._table is None and p.Name() == 'a-b' and p.relrough == 0.00025 / 0.25
+    p = pickle.loads(pickle.dumps(p))
+    PN = exampleNetwork()
+    PN.pipes.append(p)
+    assert p._table is PN.pipes.table and PN.getFlows()[-1] == 0.5
+    p.Q = 0.75
+    other = PipeNetwork(Pipes=[PN.pipes.pop()])
+    assert p._table is other.pipes.table and p.Q == 0.75 and p.d == 0.25
+    assert len(PN.pipes) == len(PN.pipes.table) == 10
+
+
+def test_scenarios_match_networks_solved_one_by_one():
+    PN = exampleNetwork()
+    PN.findFlowRates('gga')
+    before = PN.getFlows()
+    scenarios = [{}, {'demands': {'a': 50, 'd': -20}}, {'closed': ['d-g']},
+                 {'demands': {'a': 50, 'd': -20}, 'closed': ['d-g', 'a-c']}]
+    flows, status = PN.solveScenarios(scenarios, processes=1)
+    pooled, pooledStatus = PN.solveScenarios(scenarios, processes=2, chunksize=1)
+    assert np.array_equal(flows, pooled) and np.array_equal(status, pooledStatus)
+    assert status['converged'].all() and np.array_equal(PN.getFlows(), before) and PN.getNode('a').extFlow == 60
+
+    for scenario, Q in zip(scenarios, flows):
+        one = exampleNetwork()
+        one.loops = []
+        for name, q in scenario.get('demands', {}).items():
+            one.getNode(name).extFlow = q
+        closed = [one.getPipe(name)._index for name in scenario.get('closed', ())]
+        for i in sorted(closed, reverse=True):
+            one.pipes.pop(i)
+        one.findFlowRates('gga')
+        assert np.max(np.abs(np.delete(Q, closed) - one.getFlows())) < 1e-8 and not Q[closed].any()
+
+    for scenario in ({'closed': ['a-z']}, {'demands': {'z': 1.0}}):
+        try:
+            PN.solveScenarios([scenario], processes=1)
+            assert False, 'an unknown name was accepted'
+        except ValueError:
+            pass
+
+
+def test_network_file_loads_the_example_network():
+    PN = PipeNetwork()
+    PN.buildNetworkFromFile(os.path.join(HERE, 'PipeNetwork.txt'))
+    example = exampleNetwork()
+    assert [p.Name() for p in PN.pipes] == [p.Name() for p in example.pipes]
+    for name in ('length', 'd', 'r'):
+        assert [getattr(p, name) for p in PN.pipes] == [getattr(p, name) for p in example.pipes]
+    assert {n.name: n.extFlow for n in PN.nodes} == {n.name: n.extFlow for n in example.nodes}
+    assert PN.getNode('c').pipes == [PN.getPipe('a-c'), PN.getPipe('c-d'), PN.getPipe('c-f')]
+    PN.findFlowRates()
+    example.findFlowRates()
+    assert np.max(np.abs(PN.getFlows() - example.getFlows())) < 1e-9
+
+
+def test_network_file_chunks_comments_and_errors():
+    records = ['n{} n{} {} {} 0.00025'.format(i, i + 1, 100 + i, 200) for i in range(10)]
+    with tempfile.TemporaryDirectory() as workdir:
+        def read(*lines, **kwargs):
+            filename = os.path.join(workdir, 'network.txt')
+            with open(filename, 'w') as f:
+                f.write('\n'.join(lines) + '\n')
+            return readNetworkFile(filename, **kwargs)
+
+        whole = read('[PIPES]  ; ten pipes', *records, '[Demands] # two', 'n0 1.5  # in', 'n10 -1.5')
+        chunked = read('[PIPES]', *records, '[DEMANDS]', 'n0 1.5', 'n10 -1.5', chunkSize=3)
+        for section in ('pipes', 'demands'):
+            for name, column in whole[section].items():
+                assert np.array_equal(column, chunked[section][name])
+        assert whole['pipes']['length'].tolist() == list(range(100, 110))
+        assert whole['demands']['node'].tolist() == ['n0', 'n10'] and whole['demands']['extFlow'][0] == 1.5
+
+        for lines, message in ((('[PIPES]', 'a b 100 200'), ':2: expected 5 fields'),
+                               (('[PIPES]', 'a b 100 wide 0.00025'), 'bad diameter'),
+                               (('[VALVES]',), ':1: unknown section'),
+                               (('a b 100 200 0.00025',), ':1: record outside of a section')):
+            try:
+                read(*lines, chunkSize=1)
+                assert False, 'no error for ' + message
+            except ValueError as e:
+                assert message in str(e), str(e)
+
+        filename = os.path.join(workdir, 'network.txt')
+        with open(filename, 'w') as f:
+            f.write('[PIPES]\na b 100 200 0.00025\n[DEMANDS]\nz 1.0\n')
+        try:
+            PipeNetwork().buildNetworkFromFile(filename)
+            assert False, 'a demand for an unconnected node was accepted'
+        except ValueError as e:
+            assert 'no pipe connects' in str(e)
+
+
+def main():
+    for name, test in sorted(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print('passed:', name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from rankine import Rankine, calc_cycles, sweep
+from steam import Steam, state_cache
+from steam_tables import get_tables
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+BASELINE_FILE = os.path.join(HERE, 'bench_baseline.json')
+
+COLD_START = ('import time; start = time.perf_counter(); from steam import Steam; Steam({}).h; '
+              'print(time.perf_counter() - start)')
+
+
+def measure(fn, n, repeat=5):
+    """Best-of-repeat throughput of fn, which performs n operations per call, in operations per second."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return n / best
+
+
+def cold_start(state, repeat=3):
+    """Best seconds from importing steam to the first computed state, each run in a fresh interpreter."""
+    best = float('inf')
+    for _ in range(repeat):
+        run = subprocess.run([sys.executable, '-c', COLD_START.format(state)], cwd=HERE,
+                             capture_output=True, text=True, check=True)
+        best = min(best, float(run.stdout.split()[-1]))
+    return best
+
+
+def run_benchmarks(n=2000, batch=20000):
+    get_tables()  # parse the tables outside the timed region
+    rng = np.random.default_rng(0)
+    p_sat = rng.uniform(10, 15000, n).tolist()
+    quality = rng.uniform(0, 1, n).tolist()
+    h_sat = rng.uniform(500, 2500, n).tolist()
+    s_sat = rng.uniform(2, 5.5, n).tolist()
+    p_sup = rng.uniform(100, 8000, n).tolist()
+    t_sup = rng.uniform(320, 480, n).tolist()
+    p_cycle = rng.uniform(2000, 8000, n // 4).tolist()
+
+    def states(**columns):
+        # Steam resolves lazily, so read a property to time the full state evaluation
+        keys = list(columns)
+        rows = list(zip(*columns.values()))
+        return lambda: [Steam(row[0], **dict(zip(keys[1:], row[1:]))).T for row in rows]
+
+    results = {}
+    # Reported as starts per second so that, like everything else here, bigger is better
+    results['cold_start_saturated'] = 1.0 / cold_start('8000, x=1')
+    results['cold_start_superheated'] = 1.0 / cold_start('8000, T=500')
+
+    state_cache.enabled = False
+    try:
+        results['steam_saturated_x'] = measure(states(p=p_sat, x=quality), n)
+        results['steam_saturated_h'] = measure(states(p=p_sat, h=h_sat), n)
+        results['steam_saturated_s'] = measure(states(p=p_sat, s=s_sat), n)
+        results['steam_superheated_T'] = measure(states(p=p_sup, T=t_sup), n)
+        results['rankine_calc_efficiency'] = measure(
+            lambda: [Rankine(8, p, t).calc_efficiency() for p, t in zip(p_cycle, t_sup)], n // 4)
+    finally:
+        state_cache.enabled = True
+    state_cache.clear()
+    results['rankine_calc_efficiency_cached'] = measure(
+        lambda: [Rankine(8, 8000, 500).calc_efficiency() for _ in range(n // 4)], n // 4)
+
+    p_high = rng.uniform(2000, 15000, batch)
+    t_high = rng.uniform(450, 650, batch)
+    results['calc_cycles_batch'] = measure(lambda: calc_cycles(8, p_high, t_high), batch)
+    grid = (np.linspace(5, 50, 10), np.linspace(2000, 15000, 40), np.linspace(400, 650, 50))
+    results['sweep_grid'] = measure(lambda: sweep(*grid, processes=1), 10 * 40 * 50)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Names of benchmarks whose throughput dropped by more than threshold (a fraction) against the baseline."""
+    regressions = []
+    for name, ops in results.items():
+        reference = baseline.get('benchmarks', {}).get(name)
+        if reference is None:
+            continue
+        limit = baseline.get('thresholds', {}).get(name, threshold)
+        if ops < reference * (1.0 - limit):
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Throughput benchmarks for Steam and Rankine.')
+    parser.add_argument('--baseline', default=BASELINE_FILE, help='JSON baseline to compare against or save to')
+    parser.add_argument('--save', action='store_true', help='record these results as the new baseline')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='allowed fractional throughput drop before a benchmark counts as a regression')
+    parser.add_argument('-n', type=int, default=2000, help='scalar states per benchmark')
+    args = parser.parse_args()
+
+    results = run_benchmarks(n=args.n)
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    print('{:<34}{:>16}{:>16}'.format('benchmark', 'ops/s', 'baseline'))
+    for name, ops in results.items():
+        reference = baseline.get('benchmarks', {}).get(name)
+        print('{:<34}{:>16,.0f}{:>16}'.format(name, ops, '-' if reference is None else '{:,.0f}'.format(reference)))
+    print('import-to-first-result: {:.1f} ms saturated, {:.1f} ms superheated'.format(
+        1000.0 / results['cold_start_saturated'], 1000.0 / results['cold_start_superheated']))
+
+    if args.save:
+        baseline = {'benchmarks': results, 'thresholds': baseline.get('thresholds', {}),
+                    'python': sys.version.split()[0], 'numpy': np.__version__}
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2)
+        print('Baseline written to', args.baseline)
+        return 0
+
+    regressions = compare(results, baseline, args.threshold)
+    for name in regressions:
+        print('REGRESSION: {} is more than {:.0%} slower than baseline'.format(
+            name, baseline.get('thresholds', {}).get(name, args.threshold)))
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
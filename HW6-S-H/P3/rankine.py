@@ -1,4 +1,11 @@
-from steam import Steam  # Assuming Steam class is in the steam.py file
+import numpy as np
+
+from steam import Steam, SteamArray  # Assuming Steam class is in the steam.py file
+
+# Layout of the structured arrays returned by calc_cycles and sweep
+CYCLE_DTYPE = np.dtype([('p_low', float), ('p_high', float), ('t_high', float), ('efficiency', float),
+                        ('turbine_work', float), ('pump_work', float), ('heat_added', float),
+                        ('turbine_exit_x', float)])
 
 class Rankine:
     def __init__(self, p_low=8, p_high=8000, t_high=None, name='Rankine Cycle'):
@@ -43,6 +50,38 @@ class Rankine:
             print(f"Error in calc_efficiency: {e}")
             return None
 
+    @classmethod
+    def optimize(cls, p_high=(1000, 20000), t_high=(300, 700), p_low=8, min_exit_quality=0.85,
+                 name='Optimized Rankine Cycle', popsize=30, maxiter=200, seed=None):
+        """
+        Search for the most efficient cycle within the given bounds.
+        p_high and t_high are (low, high) bounds; p_low is either fixed or a (low, high) bound as well.
+        Cycles whose turbine exit quality is below min_exit_quality, or that fall outside the steam tables,
+        are rejected. Each generation of candidates is evaluated in one calc_cycles call.
+        :return: a Rankine cycle at the optimum, with calc_efficiency already run and the
+                 scipy OptimizeResult stored in its optimization attribute
+        """
+        from scipy.optimize import differential_evolution
+
+        vary_p_low = np.ndim(p_low) > 0
+        bounds = [tuple(p_high), tuple(t_high)] + ([tuple(p_low)] if vary_p_low else [])
+
+        def objective(candidates):
+            # candidates has shape (n_parameters, n_candidates)
+            pl = candidates[2] if vary_p_low else p_low
+            cycles = calc_cycles(pl, candidates[0], candidates[1])
+            shortfall = np.nan_to_num(min_exit_quality - cycles['turbine_exit_x'], nan=1.0).clip(0.0)
+            penalty = np.where(np.isnan(cycles['efficiency']), 1.0e6, 1.0e3 * shortfall)
+            return -np.nan_to_num(cycles['efficiency']) + penalty
+
+        result = differential_evolution(objective, bounds, popsize=popsize, maxiter=maxiter, seed=seed,
+                                        vectorized=True, updating='deferred', polish=False)
+        best = result.x
+        cycle = cls(p_low=best[2] if vary_p_low else p_low, p_high=best[0], t_high=best[1], name=name)
+        cycle.calc_efficiency()
+        cycle.optimization = result
+        return cycle
+
     def print_summary(self):
         if self.efficiency is None:
             self.calc_efficiency()
@@ -56,6 +95,74 @@ class Rankine:
         print(self.state3)
         print(self.state4)
 
+def calc_cycles(p_low, p_high, t_high=None):
+    """
+    Vectorized Rankine.calc_efficiency over broadcast arrays of p_low, p_high and t_high.
+    A t_high of None or NaN means saturated vapor at the turbine inlet. Cycles that Rankine
+    could not evaluate come back as NaN. Returns a structured array with CYCLE_DTYPE fields.
+    """
+    t_high = np.nan if t_high is None else t_high
+    p_low, p_high, t_high = np.broadcast_arrays(np.asarray(p_low, dtype=float), np.asarray(p_high, dtype=float),
+                                                np.asarray(t_high, dtype=float))
+    result = np.empty(p_low.shape, dtype=CYCLE_DTYPE)
+    result['p_low'], result['p_high'], result['t_high'] = p_low, p_high, t_high
+
+    # State 1: Turbine inlet, saturated vapor where no t_high was given
+    h1 = np.empty(p_low.shape)
+    s1 = np.empty(p_low.shape)
+    sat = np.isnan(t_high)
+    state1 = SteamArray(p_high[sat], x=1)
+    h1[sat], s1[sat] = state1.h, state1.s
+    state1 = SteamArray(p_high[~sat], T=t_high[~sat])
+    h1[~sat], s1[~sat] = state1.h, state1.s
+
+    # State 2: Turbine exit, State 3: Pump inlet, State 4: Pump exit estimated from the pump inlet
+    state2 = SteamArray(p_low, s=s1)
+    state3 = SteamArray(p_low, x=0)
+    h4 = state3.h + state3.v * (p_high - p_low)
+
+    result['turbine_work'] = h1 - state2.h
+    result['pump_work'] = h4 - state3.h
+    result['heat_added'] = h1 - h4
+    result['efficiency'] = 100.0 * (result['turbine_work'] - result['pump_work']) / result['heat_added']
+    result['turbine_exit_x'] = state2.x
+    return result
+
+
+def _calc_cycle_chunk(chunk):
+    return calc_cycles(*chunk)
+
+
+def sweep(p_low, p_high, t_high=None, grid=True, processes=None, chunksize=4096):
+    """
+    Parametric Rankine study. With grid=True every combination of the p_low, p_high and t_high ranges
+    is evaluated and the result has shape (len(p_low), len(p_high), len(t_high)); otherwise the inputs
+    are broadcast against each other. Cycles are split into chunks of chunksize and spread over a
+    process pool (processes=1 evaluates in this process). Returns a structured array with CYCLE_DTYPE fields.
+    """
+    t_high = np.nan if t_high is None else t_high
+    if grid:
+        axes = [np.atleast_1d(np.asarray(a, dtype=float)) for a in (p_low, p_high, t_high)]
+        p_low, p_high, t_high = np.meshgrid(*axes, indexing='ij')
+    else:
+        p_low, p_high, t_high = np.broadcast_arrays(np.asarray(p_low, dtype=float), np.asarray(p_high, dtype=float),
+                                                    np.asarray(t_high, dtype=float))
+    shape = p_low.shape
+    flat = [a.ravel() for a in (p_low, p_high, t_high)]
+    n = flat[0].size
+    chunks = [tuple(a[i:i + chunksize] for a in flat) for i in range(0, n, chunksize)]
+
+    if processes == 1 or len(chunks) <= 1:
+        parts = [_calc_cycle_chunk(chunk) for chunk in chunks]
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(max_workers=processes) as pool:
+            parts = list(pool.map(_calc_cycle_chunk, chunks))
+    result = np.concatenate(parts) if parts else np.empty(0, dtype=CYCLE_DTYPE)
+    return result.reshape(shape)
+
+
 def main():
     rankine1 = Rankine(p_low=8, p_high=8000, t_high=None, name='Rankine Cycle Case i')
     eff1 = rankine1.calc_efficiency()
@@ -0,0 +1,158 @@
+import asyncio
+import time
+from collections import deque
+
+import numpy as np
+
+from rankine import CYCLE_DTYPE, calc_cycles
+from steam_tables import get_tables
+
+
+class RankineBatchService:
+    """
+    Asyncio front end for Rankine cycle evaluation. Concurrent evaluate() calls are queued and grouped into
+    micro-batches that close when max_batch_size queries are waiting or max_delay seconds after the first one
+    arrived, whichever comes first. Each batch is evaluated in one calc_cycles call on a worker thread, so the
+    event loop stays free while it runs.
+    """
+    def __init__(self, max_batch_size=256, max_delay=0.002, latency_window=10000):
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.requests = 0
+        self.batches = 0
+        self.busy_time = 0.0
+        self._latencies = deque(maxlen=latency_window)
+        self._queue = None
+        self._worker = None
+        self._started = None
+        self._batch = []
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    async def start(self):
+        if self._worker is None:
+            self._queue = asyncio.Queue()
+            self._started = time.perf_counter()
+            self._worker = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Finish every query already queued, then stop the batching task."""
+        if self._worker is None:
+            return
+        worker = self._worker
+        await self._queue.put(None)
+        try:
+            await worker
+        finally:
+            self._worker = None
+
+    async def evaluate(self, p_low, p_high, t_high=None):
+        """
+        Efficiency, works and heat added for one cycle, as a dict keyed like CYCLE_DTYPE. A query that cannot be
+        evaluated fails the queries batched with it, not the service.
+        """
+        if self._worker is None:
+            await self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((p_low, p_high, np.nan if t_high is None else t_high, time.perf_counter(), future))
+        return await future
+
+    async def _run(self):
+        try:
+            await self._serve()
+        except BaseException as e:
+            # nothing will answer the queued queries any more, so fail them rather than leave callers waiting;
+            # the error is delivered through their futures and the next evaluate() starts a fresh task
+            self._worker = None
+            error = e if isinstance(e, Exception) else RuntimeError('batching task stopped')
+            pending = self._batch
+            while not self._queue.empty():
+                pending.append(self._queue.get_nowait())
+            for item in pending:
+                if item is not None and not item[4].done():
+                    item[4].set_exception(error)
+            self._batch = []
+            if error is not e:
+                raise
+
+    async def _serve(self):
+        loop = asyncio.get_running_loop()
+        # Load the tables and build the interpolators up front so the first batch does not pay for them
+        await loop.run_in_executor(None, lambda: get_tables().superheated)
+        stopping = False
+        while not stopping:
+            first = await self._queue.get()
+            if first is None:
+                break
+            self._batch = batch = [first]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._evaluate_batch(loop, batch)
+            self._batch = []
+
+    async def _evaluate_batch(self, loop, batch):
+        start = time.perf_counter()
+        try:
+            p_low, p_high, t_high = (np.array(column, dtype=float) for column in list(zip(*batch))[:3])
+            cycles = await loop.run_in_executor(None, calc_cycles, p_low, p_high, t_high)
+        except Exception as e:
+            for item in batch:
+                if not item[4].done():
+                    item[4].set_exception(e)
+            return
+        done = time.perf_counter()
+        self.busy_time += done - start
+        self.batches += 1
+        self.requests += len(batch)
+        for item, cycle in zip(batch, cycles):
+            self._latencies.append(done - item[3])
+            if not item[4].done():
+                item[4].set_result({name: float(cycle[name]) for name in CYCLE_DTYPE.names})
+
+    def stats(self):
+        latencies = np.array(self._latencies)
+        elapsed = time.perf_counter() - self._started if self._started is not None else 0.0
+        return {
+            'requests': self.requests,
+            'batches': self.batches,
+            'mean_batch_size': self.requests / self.batches if self.batches else 0.0,
+            'throughput': self.requests / elapsed if elapsed > 0 else 0.0,
+            'latency_p50': float(np.percentile(latencies, 50)) if latencies.size else None,
+            'latency_p95': float(np.percentile(latencies, 95)) if latencies.size else None,
+            'latency_max': float(latencies.max()) if latencies.size else None,
+            'busy_time': self.busy_time,
+        }
+
+
+async def demo(n=5000):
+    rng = np.random.default_rng(0)
+    async with RankineBatchService(max_batch_size=512, max_delay=0.005) as service:
+        queries = [service.evaluate(8, p, t) for p, t in zip(rng.uniform(2000, 15000, n), rng.uniform(450, 650, n))]
+        results = await asyncio.gather(*queries)
+    print('First result:', results[0])
+    for key, value in service.stats().items():
+        print('{:>16}: {}'.format(key, value))
+
+
+def main():
+    asyncio.run(demo())
+
+
+if __name__ == "__main__":
+    main()
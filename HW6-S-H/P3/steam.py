@@ -1,82 +1,165 @@
+import threading
+from collections import OrderedDict
+
 import numpy as np
-from scipy.interpolate import griddata
+
+from steam_tables import get_tables
+
+# Region codes reported per element by SteamArray
+REGION_UNDEFINED = 0
+REGION_SATURATED = 1
+REGION_SUPERHEATED = 2
+REGION_NAMES = {REGION_UNDEFINED: None, REGION_SATURATED: 'Saturated', REGION_SUPERHEATED: 'Superheated'}
+
+
+class SteamStateCache:
+    """
+    Bounded LRU cache of computed Steam states, keyed on the pressure and the property values a state was
+    defined by. Entries belong to the table set they were computed from and are dropped when tables change.
+    """
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.enabled = True
+        self.hits = 0
+        self.misses = 0
+        self._states = OrderedDict()
+        self._tables = None
+        self._lock = threading.Lock()
+
+    def get(self, tables, key):
+        if not self.enabled:
+            return None
+        with self._lock:
+            if tables is not self._tables:
+                self._states.clear()
+                self._tables = tables
+            props = self._states.get(key)
+            if props is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._states.move_to_end(key)
+            return props
+
+    def put(self, tables, key, props):
+        if not self.enabled or self.maxsize <= 0:
+            return
+        with self._lock:
+            if tables is not self._tables:
+                return
+            self._states[key] = props
+            self._states.move_to_end(key)
+            while len(self._states) > self.maxsize:
+                self._states.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._states.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def info(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._states), 'maxsize': self.maxsize,
+                'enabled': self.enabled}
+
+
+# Shared by every Steam instance, so cycles that revisit a state pay for it once
+state_cache = SteamStateCache()
+
+
+def _lazy_property(name):
+    # State properties are computed on first access; assigning one finishes any pending calculation first,
+    # so an override (like Rankine's pump-exit enthalpy) replaces the computed value rather than redefining the state
+    attr = '_' + name
+
+    def get(self):
+        if self._pending:
+            self.calculate_properties()
+        return getattr(self, attr)
+
+    def set(self, value):
+        if self._pending:
+            self.calculate_properties()
+        setattr(self, attr, value)
+
+    return property(get, set)
 
 
 class Steam:
+    __slots__ = ('p', 'name', '_T', '_x', '_v', '_h', '_s', '_region', '_pending')
+
+    T = _lazy_property('T')
+    x = _lazy_property('x')
+    v = _lazy_property('v')
+    h = _lazy_property('h')
+    s = _lazy_property('s')
+    region = _lazy_property('region')
+
     def __init__(self, pressure, T=None, x=None, v=None, h=None, s=None, name=None):
         self.p = pressure
-        self.T = T
-        self.x = x
-        self.v = v
-        self.h = h
-        self.s = s
+        self._T = T
+        self._x = x
+        self._v = v
+        self._h = h
+        self._s = s
         self.name = name
-        self.region = None
-        if T is None and x is None and v is None and h is None and s is None:
-            return
-        else:
-            self.calculate_properties()
+        self._region = None
+        self._pending = not (T is None and x is None and v is None and h is None and s is None)
 
     def calculate_properties(self):
         try:
-            # Read in the thermodynamic data from the saturated water table file
-            ts, ps, hfs, hgs, sfs, sgs, vfs, vgs = np.loadtxt('sat_water_table.txt', unpack=True, skiprows=1)
+            # Thermodynamic data comes from the shared table store, parsed once per process
+            tables = get_tables()
 
-            # Assuming the superheated properties file has columns: Temperature, Enthalpy, Entropy, Pressure
-            tcol, hcol, scol, pcol = np.loadtxt('superheated_water_table.txt', unpack=True, skiprows=1)
+            key = (self.p, self._T, self._x, self._v, self._h, self._s)
+            cached = state_cache.get(tables, key)
+            if cached is not None:
+                self._T, self._x, self._v, self._h, self._s, self._region = cached
+                self._pending = False
+                return
 
-            R = 8.314 / (18 / 1000)
             Pbar = self.p / 100
 
             # Get saturated properties
-            Tsat = float(griddata(ps, ts, Pbar))
-            hf = float(griddata(ps, hfs, Pbar))
-            hg = float(griddata(ps, hgs, Pbar))
-            sf = float(griddata(ps, sfs, Pbar))
-            sg = float(griddata(ps, sgs, Pbar))
-            vf = float(griddata(ps, vfs, Pbar))
-            vg = float(griddata(ps, vgs, Pbar))
-
-            self.hf = hf
-
-            if self.T is not None:
-                if self.T > Tsat:
-                    self.region = 'Superheated'
-                    self.h = float(griddata((tcol, pcol), hcol, (self.T, Pbar)))
-                    self.s = float(griddata((tcol, pcol), scol, (self.T, Pbar)))
-                    self.x = 1.0
-                    TK = self.T + 273.14
-                    self.v = R * TK / (self.p * 1000)
-            elif self.x is not None:
-                self.region = 'Saturated'
-                self.T = Tsat
-                self.h = hf + self.x * (hg - hf)
-                self.s = sf + self.x * (sg - sf)
-                self.v = vf + self.x * (vg - vf)
-            elif self.h is not None:
-                self.x = (self.h - hf) / (hg - hf)
-                if self.x <= 1.0:
-                    self.region = 'Saturated'
-                    self.T = Tsat
-                    self.s = sf + self.x * (sg - sf)
-                    self.v = vf + self.x * (vg - vf)
+            Tsat, hf, hg, sf, sg, vf, vg = tables.saturation.at_pressure(Pbar)
+
+            if self._T is not None:
+                if self._T > Tsat:
+                    self._region = 'Superheated'
+                    self._h, self._s, self._v = tables.superheated.at_temperature(self._T, self.p, strict=True)
+                    self._x = 1.0
+            elif self._x is not None:
+                self._region = 'Saturated'
+                self._T = Tsat
+                self._h = hf + self._x * (hg - hf)
+                self._s = sf + self._x * (sg - sf)
+                self._v = vf + self._x * (vg - vf)
+            elif self._h is not None:
+                self._x = (self._h - hf) / (hg - hf)
+                if self._x <= 1.0:
+                    self._region = 'Saturated'
+                    self._T = Tsat
+                    self._s = sf + self._x * (sg - sf)
+                    self._v = vf + self._x * (vg - vf)
                 else:
-                    self.region = 'Superheated'
-                    self.T = float(griddata((hgs, ps), ts, (self.h, Pbar)))
-                    self.s = float(griddata((hgs, ps), sgs, (self.h, Pbar)))
-            elif self.s is not None:
-                self.x = (self.s - sf) / (sg - sf)
-                if self.x <= 1.0:
-                    self.region = 'Saturated'
-                    self.T = Tsat
-                    self.h = hf + self.x * (hg - hf)
-                    self.v = vf + self.x * (vg - vf)
+                    self._region = 'Superheated'
+                    self._T, self._s, self._v = tables.superheated.at_enthalpy(self._h, self.p, strict=True)
+            elif self._s is not None:
+                self._x = (self._s - sf) / (sg - sf)
+                if self._x <= 1.0:
+                    self._region = 'Saturated'
+                    self._T = Tsat
+                    self._h = hf + self._x * (hg - hf)
+                    self._v = vf + self._x * (vg - vf)
                 else:
-                    self.region = 'Superheated'
-                    self.T = float(griddata((sgs, ps), ts, (self.s, Pbar)))
-                    self.h = float(griddata((sgs, ps), hgs, (self.s, Pbar)))
+                    self._region = 'Superheated'
+                    self._T, self._h, self._v = tables.superheated.at_entropy(self._s, self.p, strict=True)
+
+            self._pending = False
+            state_cache.put(tables, key, (self._T, self._x, self._v, self._h, self._s, self._region))
 
         except FileNotFoundError:
+            self._pending = False
             print("Error: Steam table file not found!")
 
     def print_properties(self):
@@ -95,6 +178,76 @@ class Steam:
         print()
 
 
+class SteamArray:
+    """
+    Batch counterpart of Steam: evaluates many states at once from an array of pressures (kPa) and one array
+    of T, x, h or s, following the same rules as Steam.calculate_properties. Properties a scalar Steam would
+    leave as None are NaN here, and region holds one of the REGION_* codes per element.
+    """
+    def __init__(self, pressure, T=None, x=None, h=None, s=None):
+        given = [(key, value) for key, value in (('T', T), ('x', x), ('h', h), ('s', s)) if value is not None]
+        if len(given) != 1:
+            raise ValueError('SteamArray needs exactly one of T, x, h or s')
+        key, value = given[0]
+        p, value = np.broadcast_arrays(np.asarray(pressure, dtype=float), np.asarray(value, dtype=float))
+        self.p = p.copy()
+        self.T = np.full(p.shape, np.nan)
+        self.x = np.full(p.shape, np.nan)
+        self.v = np.full(p.shape, np.nan)
+        self.h = np.full(p.shape, np.nan)
+        self.s = np.full(p.shape, np.nan)
+        self.region = np.full(p.shape, REGION_UNDEFINED, dtype=np.int8)
+        # States whose superheated lookup fell outside the table data (their properties are NaN)
+        self.out_of_table = np.zeros(p.shape, dtype=bool)
+        getattr(self, key)[...] = value
+        self.calculate_properties(key)
+
+    def calculate_properties(self, key):
+        tables = get_tables()
+
+        Pbar = self.p / 100
+        # Look up on a 1-D view so 0-d inputs still get arrays back
+        Tsat, hf, hg, sf, sg, vf, vg = (a.reshape(Pbar.shape) for a in tables.saturation.at_pressure(Pbar.ravel()))
+
+        if key == 'T':
+            sup = self.T > Tsat
+            self.region[sup] = REGION_SUPERHEATED
+            self.h[sup], self.s[sup], self.v[sup] = tables.superheated.at_temperature(self.T[sup], self.p[sup])
+            self.x[sup] = 1.0
+            self.out_of_table[sup] = np.isnan(self.h[sup])
+            return
+
+        if key == 'x':
+            sat = np.ones(self.p.shape, dtype=bool)
+        elif key == 'h':
+            self.x[...] = (self.h - hf) / (hg - hf)
+            sat = self.x <= 1.0
+        else:
+            self.x[...] = (self.s - sf) / (sg - sf)
+            sat = self.x <= 1.0
+        sup = ~sat
+
+        self.region[sat] = REGION_SATURATED
+        self.T[sat] = Tsat[sat]
+        xs = self.x[sat]
+        if key != 'h':
+            self.h[sat] = hf[sat] + xs * (hg[sat] - hf[sat])
+        if key != 's':
+            self.s[sat] = sf[sat] + xs * (sg[sat] - sf[sat])
+        self.v[sat] = vf[sat] + xs * (vg[sat] - vf[sat])
+
+        if sup.any():
+            self.region[sup] = REGION_SUPERHEATED
+            if key == 'h':
+                self.T[sup], self.s[sup], self.v[sup] = tables.superheated.at_enthalpy(self.h[sup], self.p[sup])
+            else:
+                self.T[sup], self.h[sup], self.v[sup] = tables.superheated.at_entropy(self.s[sup], self.p[sup])
+            self.out_of_table[sup] = np.isnan(self.T[sup])
+
+    def region_names(self):
+        return np.array([REGION_NAMES[code] for code in self.region.ravel()], dtype=object).reshape(self.region.shape)
+
+
 def main():
     # Example usage
     inlet = Steam(7350, name='Turbine Inlet')
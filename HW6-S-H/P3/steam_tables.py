@@ -0,0 +1,404 @@
+import copy
+import math
+import os
+import threading
+from bisect import bisect_left
+from functools import cached_property
+
+import numpy as np
+
+TABLE_DIR = os.path.dirname(os.path.abspath(__file__))
+SAT_TABLE_FILE = os.path.join(TABLE_DIR, 'sat_water_table.txt')
+SUPERHEATED_TABLE_FILE = os.path.join(TABLE_DIR, 'superheated_water_table.txt')
+
+
+class SteamTables:
+    def __init__(self, sat_file=SAT_TABLE_FILE, superheated_file=SUPERHEATED_TABLE_FILE):
+        self.sat_file = sat_file
+        self.superheated_file = superheated_file
+
+        # Saturated table columns: Temperature (C), Pressure (bar), hf, hg, sf, sg, vf, vg
+        self.ts, self.ps, self.hfs, self.hgs, self.sfs, self.sgs, self.vfs, self.vgs = load_table(sat_file)
+
+        # Superheated table columns: Temperature (C), Enthalpy, Entropy, Pressure (kPa)
+        self.tcol, self.hcol, self.scol, self.pcol = load_table(superheated_file)
+
+        self.saturation = SaturationLine(self)
+
+    @cached_property
+    def superheated(self):
+        return SuperheatedTable(self)
+
+
+def compiled_path(text_file):
+    return os.path.splitext(text_file)[0] + '.npz'
+
+
+def _fingerprint(text_file):
+    stat = os.stat(text_file)
+    return np.array([stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+
+
+def load_table(text_file, compile=True):
+    """
+    Columns of a whitespace-delimited table with one header row. The parsed columns are kept in a binary
+    .npz next to the text file, tagged with the text file's size and modification time; that copy is used
+    while the tags still match and rebuilt from the text whenever they do not.
+    """
+    fingerprint = _fingerprint(text_file)
+    binary = compiled_path(text_file)
+    try:
+        with np.load(binary) as data:
+            if np.array_equal(data['source'], fingerprint):
+                return data['columns']
+    except (OSError, KeyError, ValueError):
+        pass
+    columns = np.loadtxt(text_file, unpack=True, skiprows=1)
+    if compile:
+        compile_table(text_file, columns, fingerprint)
+    return columns
+
+
+def compile_table(text_file, columns=None, fingerprint=None):
+    """Write the binary copy of a text table. Failing to write (e.g. a read-only install) is not an error."""
+    if columns is None:
+        fingerprint = _fingerprint(text_file)
+        columns = np.loadtxt(text_file, unpack=True, skiprows=1)
+    binary = compiled_path(text_file)
+    partial = '{}.{}.tmp'.format(binary, os.getpid())
+    try:
+        with open(partial, 'wb') as f:
+            np.savez(f, columns=columns, source=fingerprint)
+        os.replace(partial, binary)
+        return binary
+    except OSError:
+        if os.path.exists(partial):
+            os.remove(partial)
+        return None
+
+
+class SteamTableRangeError(ValueError):
+    """Raised when a requested state lies outside the data in the steam tables."""
+
+
+class SaturationLine:
+    """
+    Saturation properties sorted along the dome once, so one binary search gives every property.
+    at_pressure returns (Tsat, hf, hg, sf, sg, vf, vg); at_temperature returns (psat, hf, hg, sf, sg, vf, vg).
+    Both accept scalars or arrays and give NaN outside the table, as griddata did.
+    """
+    def __init__(self, tables):
+        order = np.argsort(tables.ps)
+        self.p = tables.ps[order]
+        self.T = tables.ts[order]
+        liquid_vapor = np.vstack((tables.hfs, tables.hgs, tables.sfs, tables.sgs, tables.vfs, tables.vgs))[:, order]
+        self.by_p = np.vstack((self.T, liquid_vapor))
+        self.by_T = np.vstack((self.p, liquid_vapor))
+
+        # Plain Python copies for the scalar path, which is dominated by NumPy call overhead otherwise
+        self._p_keys = self.p.tolist()
+        self._T_keys = self.T.tolist()
+        self._p_rows = self.by_p.T.tolist()
+        self._T_rows = self.by_T.T.tolist()
+
+    def at_pressure(self, Pbar):
+        if np.ndim(Pbar) == 0:
+            return self._scalar_lookup(self._p_keys, self._p_rows, float(Pbar))
+        return tuple(self._array_lookup(self.p, self.by_p, Pbar))
+
+    def at_temperature(self, T):
+        if np.ndim(T) == 0:
+            return self._scalar_lookup(self._T_keys, self._T_rows, float(T))
+        return tuple(self._array_lookup(self.T, self.by_T, T))
+
+    @staticmethod
+    def _scalar_lookup(keys, rows, x):
+        if not keys[0] <= x <= keys[-1]:
+            return (float('nan'),) * len(rows[0])
+        i = min(max(bisect_left(keys, x), 1), len(keys) - 1)
+        w = (x - keys[i - 1]) / (keys[i] - keys[i - 1])
+        lo, hi = rows[i - 1], rows[i]
+        return tuple(a + w * (b - a) for a, b in zip(lo, hi))
+
+    @staticmethod
+    def _array_lookup(keys, values, x):
+        x = np.asarray(x, dtype=float)
+        i = np.searchsorted(keys, x).clip(1, len(keys) - 1)
+        w = (x - keys[i - 1]) / (keys[i] - keys[i - 1])
+        out = values[:, i - 1] + w * (values[:, i] - values[:, i - 1])
+        out[:, (x < keys[0]) | (x > keys[-1])] = np.nan
+        return out
+
+
+# Every Steam state reads from one process-wide SteamTables instance, parsed on first use.
+_tables = None
+_lock = threading.Lock()
+
+
+def get_tables():
+    global _tables
+    tables = _tables
+    if tables is None:
+        with _lock:
+            if _tables is None:
+                _tables = SteamTables()
+            tables = _tables
+    return tables
+
+
+def load_tables(sat_file=None, superheated_file=None):
+    """Re-read the shared tables, optionally from alternate files, and make them current."""
+    tables = SteamTables(sat_file or SAT_TABLE_FILE, superheated_file or SUPERHEATED_TABLE_FILE)
+    set_tables(tables)
+    return tables
+
+
+def set_tables(tables):
+    """Replace the shared tables with an already built SteamTables instance."""
+    global _tables
+    with _lock:
+        _tables = tables
+
+
+def reset_tables():
+    """Drop the shared tables so the default files are parsed again on next use."""
+    set_tables(None)
+
+
+class SuperheatedTable:
+    """
+    Linear interpolation over the superheated table, triangulated once and shared by every state.
+    at_temperature returns (h, s, v) for T in C and p in kPa; at_enthalpy and at_entropy are the inverse
+    lookups, returning (T, s, v) and (T, h, v) from indexes built over (h, p) and (s, p).
+    Pressure is triangulated as log(p): the isobars span four decades, and in linear p the low-pressure
+    rows collapse into sliver triangles that interpolate poorly.
+    v is the ideal-gas estimate Steam has always used.
+    Points outside the table give NaN, or raise SteamTableRangeError when strict=True.
+    """
+    R = 8.314 / (18 / 1000)
+
+    def __init__(self, tables):
+        # SciPy is only imported once a state actually needs the superheated region
+        from scipy.interpolate import LinearNDInterpolator
+
+        # the source columns, kept so resampled copies can be checked against the rows they came from
+        self.tcol, self.hcol, self.scol, self.pcol = tables.tcol, tables.hcol, tables.scol, tables.pcol
+        t, h, s, p = tables.tcol, tables.hcol, tables.scol, np.log(tables.pcol)
+        self._hs = LinearNDInterpolator(np.column_stack((t, p)), np.column_stack((h, s)), rescale=True)
+        self._ts_by_h = LinearNDInterpolator(np.column_stack((h, p)), np.column_stack((t, s)), rescale=True)
+        self._th_by_s = LinearNDInterpolator(np.column_stack((s, p)), np.column_stack((t, h)), rescale=True)
+        self.T_range = (float(tables.tcol.min()), float(tables.tcol.max()))
+        self.p_range = (float(tables.pcol.min()), float(tables.pcol.max()))
+
+    def at_temperature(self, T, p, strict=False):
+        T, p = np.broadcast_arrays(np.asarray(T, dtype=float), np.asarray(p, dtype=float))
+        hs = self._hs(T, np.log(p))
+        h, s = hs[..., 0], hs[..., 1]
+        v = self.R * (T + 273.14) / (p * 1000)
+        if strict:
+            self._check(np.isnan(h), 'T', T, 'C', p)
+        if h.ndim == 0:
+            return float(h), float(s), float(v)
+        return h, s, v
+
+    def at_enthalpy(self, h, p, strict=False):
+        h, p = np.broadcast_arrays(np.asarray(h, dtype=float), np.asarray(p, dtype=float))
+        ts = self._ts_by_h(h, np.log(p))
+        T, s = ts[..., 0], ts[..., 1]
+        v = self.R * (T + 273.14) / (p * 1000)
+        if strict:
+            self._check(np.isnan(T), 'h', h, 'kJ/kg', p)
+        if T.ndim == 0:
+            return float(T), float(s), float(v)
+        return T, s, v
+
+    def at_entropy(self, s, p, strict=False):
+        s, p = np.broadcast_arrays(np.asarray(s, dtype=float), np.asarray(p, dtype=float))
+        th = self._th_by_s(s, np.log(p))
+        T, h = th[..., 0], th[..., 1]
+        v = self.R * (T + 273.14) / (p * 1000)
+        if strict:
+            self._check(np.isnan(T), 's', s, 'kJ/(kg K)', p)
+        if T.ndim == 0:
+            return float(T), float(h), float(v)
+        return T, h, v
+
+    def _check(self, outside, name, value, unit, p):
+        if not outside.any():
+            return
+        i = np.flatnonzero(outside)[0]
+        where = '{} = {:g} {} at p = {:g} kPa'.format(name, value.ravel()[i], unit, p.ravel()[i])
+        if outside.size > 1:
+            where += ' (and {} more)'.format(int(outside.sum()) - 1)
+        raise SteamTableRangeError('{} is outside the superheated steam table (T {:g}-{:g} C, p {:g}-{:g} kPa)'.format(
+            where, *self.T_range, *self.p_range))
+
+
+class FastSaturationLine:
+    """
+    SaturationLine resampled onto n points evenly spaced in log(p), so at_pressure is index arithmetic plus
+    a linear blend with no search. at_temperature is passed through to the exact line.
+    """
+    def __init__(self, exact, n=4096):
+        self.exact = exact
+        self.n = n
+        self.p_range = (float(exact.p[0]), float(exact.p[-1]))
+        self.log_p0 = math.log(self.p_range[0])
+        self.step = (math.log(self.p_range[1]) - self.log_p0) / (n - 1)
+        grid = np.exp(self.log_p0 + self.step * np.arange(n))
+        grid[[0, -1]] = self.p_range
+        self.values = np.vstack(exact.at_pressure(grid))
+        self._rows = self.values.T.tolist()
+
+    def at_pressure(self, Pbar):
+        if np.ndim(Pbar) == 0:
+            x = float(Pbar)
+            if not self.p_range[0] <= x <= self.p_range[1]:
+                return (float('nan'),) * len(self._rows[0])
+            u = (math.log(x) - self.log_p0) / self.step
+            i = min(int(u), self.n - 2)
+            w = u - i
+            lo, hi = self._rows[i], self._rows[i + 1]
+            return tuple(a + w * (b - a) for a, b in zip(lo, hi))
+        x = np.asarray(Pbar, dtype=float)
+        outside = ~((x >= self.p_range[0]) & (x <= self.p_range[1]))
+        u = (np.log(np.where(outside, self.p_range[0], x)) - self.log_p0) / self.step
+        i = np.minimum(u.astype(int), self.n - 2)
+        w = u - i
+        out = self.values[:, i] + w * (self.values[:, i + 1] - self.values[:, i])
+        out[:, outside] = np.nan
+        return tuple(out)
+
+    def at_temperature(self, T):
+        return self.exact.at_temperature(T)
+
+    def max_errors(self):
+        """Largest absolute difference from the source table rows, per returned property."""
+        fast = np.vstack(self.at_pressure(self.exact.p))
+        return dict(zip(('T', 'hf', 'hg', 'sf', 'sg', 'vf', 'vg'), np.abs(fast - self.exact.by_p).max(axis=1)))
+
+
+class FastSuperheatedTable:
+    """
+    SuperheatedTable resampled onto a uniform grid in T and log(p), so at_temperature is index arithmetic plus
+    bilinear blending. Grid cells touching the edge of the table data are left empty, and states that land in
+    them fall back to the exact interpolator. The inverse lookups are passed through to the exact table.
+    """
+    R = SuperheatedTable.R
+
+    def __init__(self, exact, saturation, n_T=512, n_p=512):
+        self.exact = exact
+        self.T_range, self.p_range = exact.T_range, exact.p_range
+        self.n_T, self.n_p = n_T, n_p
+        self.T0 = self.T_range[0]
+        self.T_step = (self.T_range[1] - self.T_range[0]) / (n_T - 1)
+        self.log_p0 = math.log(self.p_range[0])
+        self.p_step = (math.log(self.p_range[1]) - self.log_p0) / (n_p - 1)
+        T = self.T0 + self.T_step * np.arange(n_T)
+        p = np.exp(self.log_p0 + self.p_step * np.arange(n_p))
+        p[[0, -1]] = self.p_range
+        T[[0, -1]] = self.T_range
+        h, s, _ = exact.at_temperature(T[:, None], p[None, :])
+        # Grid nodes below the saturation temperature lie outside the real data even where the triangulation
+        # covers them, and h and s change steeply there, so cells reaching across the dome use the exact table
+        below_dome = T[:, None] < saturation.at_pressure(p / 100)[0][None, :]
+        h[below_dome] = np.nan
+        s[below_dome] = np.nan
+        self.h, self.s = h, s
+
+    def at_temperature(self, T, p, strict=False):
+        if np.ndim(T) == 0 and np.ndim(p) == 0:
+            h, s = self._scalar_lookup(float(T), float(p))
+            if h != h:  # NaN: outside the resampled grid
+                return self.exact.at_temperature(T, p, strict)
+            return h, s, self.R * (float(T) + 273.14) / (float(p) * 1000)
+        T, p = np.broadcast_arrays(np.asarray(T, dtype=float), np.asarray(p, dtype=float))
+        inside = (T >= self.T_range[0]) & (T <= self.T_range[1]) & (p >= self.p_range[0]) & (p <= self.p_range[1])
+        u = (np.where(inside, T, self.T0) - self.T0) / self.T_step
+        t = (np.log(np.where(inside, p, self.p_range[0])) - self.log_p0) / self.p_step
+        i = np.minimum(u.astype(int), self.n_T - 2)
+        j = np.minimum(t.astype(int), self.n_p - 2)
+        wu, wt = u - i, t - j
+        h = self._blend(self.h, i, j, wu, wt)
+        s = self._blend(self.s, i, j, wu, wt)
+        miss = ~inside | np.isnan(h)
+        if miss.any():
+            h[miss], s[miss], _ = self.exact.at_temperature(T[miss], p[miss], strict)
+        v = self.R * (T + 273.14) / (p * 1000)
+        if h.ndim == 0:
+            return float(h), float(s), float(v)
+        return h, s, v
+
+    def at_enthalpy(self, h, p, strict=False):
+        return self.exact.at_enthalpy(h, p, strict)
+
+    def at_entropy(self, s, p, strict=False):
+        return self.exact.at_entropy(s, p, strict)
+
+    def _scalar_lookup(self, T, p):
+        if not (self.T_range[0] <= T <= self.T_range[1] and self.p_range[0] <= p <= self.p_range[1]):
+            return float('nan'), float('nan')
+        u = (T - self.T0) / self.T_step
+        t = (math.log(p) - self.log_p0) / self.p_step
+        i = min(int(u), self.n_T - 2)
+        j = min(int(t), self.n_p - 2)
+        wu, wt = u - i, t - j
+        out = []
+        for grid in (self.h, self.s):
+            out.append((1 - wu) * ((1 - wt) * grid.item(i, j) + wt * grid.item(i, j + 1))
+                       + wu * ((1 - wt) * grid.item(i + 1, j) + wt * grid.item(i + 1, j + 1)))
+        return out
+
+    @staticmethod
+    def _blend(grid, i, j, wu, wt):
+        return ((1 - wu) * ((1 - wt) * grid[i, j] + wt * grid[i, j + 1])
+                + wu * ((1 - wt) * grid[i + 1, j] + wt * grid[i + 1, j + 1]))
+
+    def max_errors(self):
+        """Largest absolute difference from the source table rows for h and s, and how many rows fell back."""
+        source = self.exact
+        T, p = source.tcol, source.pcol
+        inside = ~np.isnan(self._blend(self.h, *self._cells(T, p)))
+        h, s, _ = self.at_temperature(T, p)
+        return {'h': float(np.nanmax(np.abs(h - source.hcol))), 's': float(np.nanmax(np.abs(s - source.scol))),
+                'fallback_rows': int((~inside).sum())}
+
+    def _cells(self, T, p):
+        u = (T - self.T0) / self.T_step
+        t = (np.log(p) - self.log_p0) / self.p_step
+        i = np.minimum(u.astype(int), self.n_T - 2)
+        j = np.minimum(t.astype(int), self.n_p - 2)
+        return i, j, u - i, t - j
+
+
+def use_fast_tables(enabled=True, n_sat=4096, n_T=512, n_p=512):
+    """
+    Switch the shared tables to (or back from) lookups resampled onto uniform grids.
+    The resampled copy replaces the current tables, so cached Steam states are recomputed.
+    :return: the largest absolute error of the fast lookups against the source table rows, per property
+    """
+    current = get_tables()
+    exact_saturation = getattr(current.saturation, 'exact', current.saturation)
+    exact_superheated = getattr(current.superheated, 'exact', current.superheated)
+    tables = copy.copy(current)
+    if enabled:
+        tables.saturation = FastSaturationLine(exact_saturation, n_sat)
+        tables.superheated = FastSuperheatedTable(exact_superheated, exact_saturation, n_T, n_p)
+        errors = {'saturated ' + key: float(value) for key, value in tables.saturation.max_errors().items()}
+        errors.update({'superheated ' + key: value for key, value in tables.superheated.max_errors().items()})
+    else:
+        tables.saturation = exact_saturation
+        tables.superheated = exact_superheated
+        errors = {}
+    set_tables(tables)
+    return errors
+
+
+def main():
+    for text_file in (SAT_TABLE_FILE, SUPERHEATED_TABLE_FILE):
+        binary = compile_table(text_file)
+        print('{} -> {}'.format(text_file, binary or 'not written'))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,61 @@
-from rankine import Rankine
+import asyncio
+
+import numpy as np
+
+from rankine import CYCLE_DTYPE, Rankine, calc_cycles, sweep
+from rankine_service import RankineBatchService
+
+
+def assert_cycles_equal(a, b):
+    for name in CYCLE_DTYPE.names:
+        assert np.array_equal(a[name], b[name], equal_nan=True), name
+
+
+def test_calc_cycles_matches_rankine():
+    rng = np.random.default_rng(0)
+    n = 400
+    p_low = rng.uniform(5, 50, n)
+    p_high = rng.uniform(1000, 15000, n)
+    # a quarter of the cycles start from saturated vapor
+    t_high = np.where(rng.random(n) < 0.25, np.nan, rng.uniform(400, 650, n))
+    cycles = calc_cycles(p_low, p_high, t_high)
+    for cycle, pl, ph, th in zip(cycles, p_low.tolist(), p_high.tolist(), t_high.tolist()):
+        rankine = Rankine(p_low=pl, p_high=ph, t_high=None if np.isnan(th) else th)
+        efficiency = rankine.calc_efficiency()
+        assert efficiency is not None
+        expected = (efficiency, rankine.turbine_work, rankine.pump_work, rankine.heat_added, rankine.state2.x)
+        for name, value in zip(('efficiency', 'turbine_work', 'pump_work', 'heat_added', 'turbine_exit_x'), expected):
+            assert np.isclose(cycle[name], value, rtol=1e-9, atol=1e-12), (pl, ph, th, name)
+
+
+def test_sweep_in_a_pool_matches_serial():
+    p_high = np.linspace(2000, 12000, 30)
+    t_high = np.linspace(400, 600, 20)
+    serial = sweep([8, 20], p_high, t_high, processes=1, chunksize=100)
+    pooled = sweep([8, 20], p_high, t_high, processes=2, chunksize=100)
+    assert serial.shape == (2, 30, 20)
+    assert_cycles_equal(pooled, serial)
+    p_low, p_high, t_high = np.meshgrid([8, 20], p_high, t_high, indexing='ij')
+    assert_cycles_equal(serial, calc_cycles(p_low, p_high, t_high))
+
+
+def test_service_failing_query_fails_only_its_batch():
+    async def run():
+        async with RankineBatchService(max_batch_size=2, max_delay=0.05) as service:
+            # the first two queries make up one batch and the next two another
+            results = await asyncio.gather(service.evaluate(8, 8000, 500), service.evaluate('bad', 8000, 500),
+                                           service.evaluate(8, 8000, 500), service.evaluate(8, 9000),
+                                           return_exceptions=True)
+            later = await service.evaluate(8, 8000, 500)
+            return results, later, service.stats()
+
+    results, later, stats = asyncio.run(run())
+    assert all(isinstance(result, ValueError) for result in results[:2])
+    rankine = Rankine(p_low=8, p_high=9000)
+    assert results[3]['efficiency'] == calc_cycles(8, 9000)['efficiency'] and results[3]['p_high'] == 9000
+    assert np.isclose(results[3]['efficiency'], rankine.calc_efficiency(), rtol=1e-9)
+    assert later == results[2] and stats['batches'] == 2 and stats['requests'] == 3
+
 
 def main():
     rankine1 = Rankine(p_low=8, p_high=8000, t_high=None, name='Rankine Cycle Case i')
@@ -0,0 +1,134 @@
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+import steam_tables
+from steam import REGION_NAMES, Steam, SteamArray, SteamStateCache, state_cache
+from steam_tables import (SteamTableRangeError, compiled_path, get_tables, load_table, load_tables, set_tables,
+                          use_fast_tables)
+
+PROPERTIES = ('T', 'x', 'v', 'h', 's')
+
+
+def random_states(n=300, seed=0):
+    # pressures (kPa) across the table with saturation properties at each, for building states in every region
+    rng = np.random.default_rng(seed)
+    p = np.exp(rng.uniform(np.log(10), np.log(20000), n))
+    Tsat, hf, hg, sf, sg, vf, vg = get_tables().saturation.at_pressure(p / 100)
+    return rng, p, Tsat, hf, hg, sf, sg
+
+
+def assert_matches_steam(states, key, values):
+    # every element of a SteamArray agrees with a scalar Steam defined by the same pressure and property
+    for i, (p, value) in enumerate(zip(states.p.tolist(), values.tolist())):
+        try:
+            state = Steam(p, **{key: value})
+            scalar = [getattr(state, name) for name in PROPERTIES]
+            region = state.region
+        except SteamTableRangeError:
+            assert states.out_of_table[i]
+            continue
+        assert not states.out_of_table[i] and REGION_NAMES[states.region[i]] == region
+        for name, expected in zip(PROPERTIES, scalar):
+            actual = getattr(states, name)[i]
+            if expected is None:
+                assert np.isnan(actual), (key, value, name)
+            else:
+                assert np.isclose(actual, expected, rtol=1e-10, atol=1e-12), (key, value, name, actual, expected)
+
+
+def test_steam_array_matches_steam_in_every_region():
+    rng, p, Tsat, hf, hg, sf, sg = random_states()
+    x = rng.uniform(0, 1, p.size)
+    assert_matches_steam(SteamArray(p, x=x), 'x', x)
+    # saturated where the fraction is at most 1, superheated above it
+    for key, f, g in (('h', hf, hg), ('s', sf, sg)):
+        values = f + rng.uniform(0, 1.6, p.size) * (g - f)
+        states = SteamArray(p, **{key: values})
+        assert {1, 2} <= set(states.region.tolist())
+        assert_matches_steam(states, key, values)
+    # superheated above Tsat, undefined below it
+    T = Tsat + rng.uniform(-50, 300, p.size)
+    states = SteamArray(p, T=T)
+    assert {0, 2} <= set(states.region.tolist())
+    assert_matches_steam(states, 'T', T)
+
+
+def test_state_cache_evicts_least_recent_and_follows_table_swaps():
+    cache = SteamStateCache(maxsize=2)
+    tables = get_tables()
+    for key in ('a', 'b'):
+        assert cache.get(tables, key) is None
+        cache.put(tables, key, key.upper())
+    assert cache.get(tables, 'a') == 'A'
+    cache.put(tables, 'c', 'C')
+    assert cache.get(tables, 'b') is None and cache.get(tables, 'a') == 'A' and cache.get(tables, 'c') == 'C'
+    other = object()
+    assert cache.get(other, 'a') is None and cache.info()['size'] == 0
+    cache.put(tables, 'a', 'A')
+    assert cache.info()['size'] == 0
+
+    # the shared cache drops its states when the shared tables are replaced
+    h = Steam(5000, x=0.5).h
+    state_cache.clear()
+    assert Steam(5000, x=0.5).h == h and Steam(5000, x=0.5).h == h and state_cache.hits == 1
+    try:
+        set_tables(steam_tables.SteamTables())
+        assert Steam(5000, x=0.5).h == h and state_cache.hits == 1
+    finally:
+        set_tables(tables)
+
+
+def test_load_table_rebuilds_a_stale_binary_copy():
+    with tempfile.TemporaryDirectory() as workdir:
+        text = os.path.join(workdir, 'table.txt')
+        shutil.copy(steam_tables.SAT_TABLE_FILE, text)
+        columns = load_table(text)
+        assert os.path.exists(compiled_path(text)) and np.array_equal(load_table(text), columns)
+
+        with open(text) as f:
+            lines = f.readlines()
+        fields = lines[1].split()
+        fields[2] = str(float(fields[2]) + 1.0)
+        lines[1] = '  '.join(fields) + '\n'
+        with open(text, 'w') as f:
+            f.writelines(lines)
+        stat = os.stat(text)
+        os.utime(text, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+
+        rebuilt = load_table(text)
+        assert rebuilt[2, 0] == columns[2, 0] + 1.0 and np.array_equal(rebuilt[:, 1:], columns[:, 1:])
+        with np.load(compiled_path(text)) as data:
+            assert np.array_equal(data['columns'], rebuilt)
+
+
+def test_fast_table_errors_are_measured_against_its_source():
+    tables = get_tables()
+    try:
+        errors = use_fast_tables()
+        fast = get_tables().superheated
+        assert errors['superheated h'] == fast.max_errors()['h'] and errors['superheated h'] < 10.0
+        with tempfile.TemporaryDirectory() as workdir:
+            # other superheated data becomes current, with every enthalpy 100 kJ/kg higher
+            shifted = os.path.join(workdir, 'superheated.txt')
+            columns = load_table(steam_tables.SUPERHEATED_TABLE_FILE, compile=False)
+            columns[1] += 100.0
+            np.savetxt(shifted, columns.T, header='temp h s p', comments='')
+            load_tables(superheated_file=shifted)
+            assert fast.max_errors() == {key[len('superheated '):]: value for key, value in errors.items()
+                                         if key.startswith('superheated ')}
+    finally:
+        set_tables(tables)
+
+
+def main():
+    for name, test in sorted(globals().items()):
+        if name.startswith('test_'):
+            test()
+            print('passed:', name)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, 'P2'))
+
+from HW6_2_OOP import PipeNetwork  # noqa: E402
+
+OUTPUT_FILE = os.path.join(HERE, 'bench_scaling.json')
+
+
+def timed(fn, repeat=1):
+    """
+    Best-of-repeat seconds for fn() and the result of its last call. An exception ends the phase and is
+    returned in place of the timing as {'error': ...}, so one failing phase does not stop the whole run.
+    """
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        try:
+            result = fn()
+        except Exception as e:
+            return {'error': '{}: {}'.format(type(e).__name__, e)}, None
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def write_pipe_grid(filename, n, seed=0):
+    """
+    An n x n grid of 100 m pipes with random diameters, fed at one corner and drawn off equally at the
+    other three, in the PipeNetwork file format. Returns (pipes, nodes).
+    """
+    rng = np.random.default_rng(seed)
+    name = 'n{:04d}_{:04d}'.format
+    with open(filename, 'w') as f:
+        f.write('[PIPES]\n')
+        pipes = 0
+        for i in range(n):
+            for j in range(n):
+                for k, l in ((i + 1, j), (i, j + 1)):
+                    if k < n and l < n:
+                        f.write('{} {} 100 {:.1f} 0.00025\n'.format(name(i, j), name(k, l), rng.uniform(150, 300)))
+                        pipes += 1
+        f.write('[DEMANDS]\n{} 0.3\n'.format(name(0, 0)))
+        for i, j in ((0, n - 1), (n - 1, 0), (n - 1, n - 1)):
+            f.write('{} -0.1\n'.format(name(i, j)))
+    return pipes, n * n
+
+
+def bench_pipe_grid(n, workdir, repeat, fsolve_max):
+    filename = os.path.join(workdir, 'grid_{}.txt'.format(n))
+    pipes, nodes = write_pipe_grid(filename, n)
+    row = {'n': n, 'pipes': pipes, 'nodes': nodes}
+
+    def build():
+        network = PipeNetwork()
+        network.buildNetworkFromFile(filename)
+        return network
+
+    row['build'], network = timed(build, repeat)
+    if network is None:
+        return row
+    row['solve'] = {}
+    for method in ('gga', 'fsolve'):
+        if method == 'fsolve' and n > fsolve_max:
+            row['solve'][method] = {'skipped': 'n > --fsolve-max'}
+            continue
+        seconds, _ = timed(lambda: network.findFlowRates(method), repeat)
+        info = {k: v for k, v in (network.solveInfo or {}).items() if k != 'heads'}
+        row['solve'][method] = dict(info, seconds=seconds)
+
+    if not network.loops:
+        network.buildLoops()  # so every size reports loop head losses, not only those fsolve was run on
+
+    def report():
+        with contextlib.redirect_stdout(io.StringIO()):
+            network.printPipeFlowRates()
+            network.printNetNodeFlows()
+            network.printLoopHeadLoss()
+
+    row['report'], _ = timed(report, repeat)
+    return row
+
+
+def describe(value):
+    # table cell for a phase timing, or for a solve record holding one
+    if isinstance(value, dict):
+        return describe(value['seconds']) if 'seconds' in value else 'error' if 'error' in value else 'skipped'
+    return '-' if value is None else '{:.4f}'.format(value)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Scaling benchmarks for PipeNetwork on synthetic grids.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[5, 10, 20, 40, 80],
+                        help='grid sizes n for n x n pipe networks')
+    parser.add_argument('--fsolve-max', type=int, default=15,
+                        help='largest grid size to also solve with fsolve, whose Jacobian is dense')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per phase; the best is kept')
+    parser.add_argument('--output', default=OUTPUT_FILE, help='JSON file for the scaling curves')
+    args = parser.parse_args()
+
+    results = {'python': sys.version.split()[0], 'numpy': np.__version__, 'pipe_grid': []}
+    with tempfile.TemporaryDirectory() as workdir:
+        print('{:>6}{:>10}{:>12}{:>12}{:>12}{:>12}'.format('n', 'pipes', 'build s', 'gga s', 'fsolve s', 'report s'))
+        for n in args.sizes:
+            row = bench_pipe_grid(n, workdir, args.repeat, args.fsolve_max)
+            results['pipe_grid'].append(row)
+            solve = row.get('solve', {})
+            print('{:>6}{:>10}{:>12}{:>12}{:>12}{:>12}'.format(
+                n, row['pipes'], describe(row['build']), describe(solve.get('gga')),
+                describe(solve.get('fsolve')), describe(row.get('report'))))
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print('Scaling curves written to', args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())